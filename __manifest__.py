@@ -20,9 +20,10 @@
     'sequence': 1,
     'author': 'Atharva System Pvt. Ltd.',
     'website': 'https://www.atharvasystem.com',
-    'depends': ['base', 'stock', 'product', 'web'],
+    'depends': ['base', 'stock', 'product', 'web', 'bus'],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/stock_report_config_views.xml',
     ],
     'assets': {
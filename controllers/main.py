@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import os
+import re
+import tempfile
+
+import xlsxwriter
+from werkzeug.exceptions import BadRequest, NotFound
+
+from odoo import api, http
+from odoo.http import content_disposition, request
+
+# Size of the blocks a finished XLSX file is streamed in.
+FILE_CHUNK_SIZE = 64 * 1024
+# Characters Excel does not allow in worksheet names.
+INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class StockReportController(http.Controller):
+
+    @http.route('/stock_report_v2/export/<int:config_id>', type='http', auth='user')
+    def export_matrix(self, config_id, file_format='csv', **kwargs):
+        """
+        Download the full attribute matrix of a report configuration.
+
+        Rows are read in chunks on a cursor of their own, so the query
+        result is never held in memory. CSV is sent while it is produced;
+        an XLSX file can only be sent once complete, it is built on disk
+        first and nothing is sent until then.
+        """
+        if file_format not in EXPORT_FORMATS:
+            raise BadRequest()
+        config = request.env['stock.report.config'].browse(config_id).exists()
+        if not config:
+            raise NotFound()
+        config.check_access_rights('read')
+        config.check_access_rule('read')
+
+        filename = f'{config.name}.{file_format}'
+        stream = self._stream_matrix(config, file_format)
+        return request.make_response(stream, headers=[
+            ('Content-Type', EXPORT_FORMATS[file_format]),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
+
+    def _stream_matrix(self, config, file_format):
+        # The request cursor is closed once the response is returned, the
+        # generator runs afterwards on a new one with the same environment.
+        registry = request.env.registry
+        uid, context, config_id = request.env.uid, dict(request.env.context), config.id
+
+        def generate():
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                config = env['stock.report.config'].browse(config_id)
+                if file_format == 'csv':
+                    yield from self._generate_csv(env, config)
+                else:
+                    yield from self._generate_xlsx(env, config)
+        return generate()
+
+    def _generate_csv(self, env, config):
+        exporter = env['stock.report.export']
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # the BOM lets spreadsheet applications detect UTF-8
+        buffer.write('\ufeff')
+        writer.writerow(exporter._get_export_header(config))
+        for rows in exporter._iter_matrix_rows(config):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    def _generate_xlsx(self, env, config):
+        """Build the workbook in a temporary file, then send it in chunks."""
+        exporter = env['stock.report.export']
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            # constant_memory flushes every row to disk once the next one starts
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+            sheet_name = INVALID_SHEET_CHARS.sub(' ', config.name)[:31].strip(" '")
+            worksheet = workbook.add_worksheet(sheet_name or None)
+            header_format = workbook.add_format({'bold': True})
+            header = exporter._get_export_header(config)
+            worksheet.write_row(0, 0, header, header_format)
+            worksheet.set_column(0, 1, 30)
+            worksheet.set_column(2, len(header) - 1, 10)
+            row_index = 1
+            for rows in exporter._iter_matrix_rows(config):
+                for row in rows:
+                    worksheet.write_row(row_index, 0, row)
+                    row_index += 1
+            workbook.close()
+            with open(path, 'rb') as file:
+                while chunk := file.read(FILE_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            os.unlink(path)
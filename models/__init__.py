@@ -1,2 +1,15 @@
+from . import stock_report_aggregator
+from . import stock_report_cache
+from . import stock_report_change
+from . import stock_report_search
+from . import stock_report_export
+from . import stock_report_timing
+from . import stock_report_snapshot
+from . import stock_report_precomputed
 from . import product_attribute_report
-from . import stock_report_config 
\ No newline at end of file
+from . import stock_report_config
+from . import stock_quant
+from . import stock_move
+from . import product_template
+from . import product_product
+from . import product_template_attribute_line
\ No newline at end of file
@@ -1,11 +1,45 @@
 # -*- coding: utf-8 -*-
 
 from odoo import api, models, fields, tools, _
-from odoo.exceptions import UserError
+from odoo.exceptions import AccessError, UserError
+from odoo.tools import SQL
+from collections import defaultdict
+from datetime import datetime, time
 import logging
 
+import pytz
+
+from .stock_report_aggregator import PENDING_MOVE_STATES
+from .stock_report_timing import ReportTimer
+
 _logger = logging.getLogger(__name__)
 
+MATERIALIZED_PARAM = 'stock_report_v2.materialized_report'
+MATERIALIZED_TABLE = 'product_attribute_report_store'
+CHANGED_PRODUCTS_KEY = 'stock_report_v2.changed_product_ids'
+CATALOG_PRODUCTS_KEY = 'stock_report_v2.catalog_product_ids'
+
+# Report filter types and the per-template flag each one selects on.
+FILTER_TYPES = {
+    'negative': 'has_negative',
+    'zero': 'has_zero',
+    'positive': 'has_positive',
+    'reserved': 'has_reserved',
+    'replenishment': 'has_incoming',
+    'outgoing': 'has_outgoing',
+}
+# Condition on a variant's stock behind each flag of FILTER_TYPES.
+VARIANT_FLAG_CONDITIONS = {
+    'has_negative': "qty < 0",
+    'has_zero': "qty = 0",
+    'has_positive': "qty > 0",
+    'has_reserved': "reserved_qty > 0",
+    'has_incoming': "incoming_qty > 0",
+    'has_outgoing': "outgoing_qty > 0",
+}
+# Layouts of the products in the report response, see _get_compact_products_data.
+RESPONSE_FORMATS = ('default', 'compact')
+
 class ProductAttributeReport(models.Model):
     _name = 'product.attribute.report'
     _description = 'Product Attribute Report'
@@ -30,131 +64,443 @@ class ProductAttributeReport(models.Model):
     uom_id = fields.Many2one('uom.uom', string='Unit of Measure', readonly=True)
 
     def init(self):
-        tools.drop_view_if_exists(self.env.cr, self._table)
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW %s AS (
-                WITH stock_data AS (
-                    SELECT 
-                        sq.product_id,
-                        SUM(sq.quantity) as qty_available,
-                        SUM(sq.reserved_quantity) as reserved_qty
+        if self._is_materialized():
+            self._rebuild_materialized_table()
+        else:
+            self._create_report_view()
+
+    def _is_materialized(self):
+        return tools.str2bool(
+            self.env['ir.config_parameter'].sudo().get_param(MATERIALIZED_PARAM, 'False')
+        )
+
+    def _get_report_query(self, product_ids=None):
+        """
+        SELECT producing the report rows, without their ``id``.
+
+        When ``product_ids`` is given only the rows of those variants are
+        produced, which is what the incremental refresh of the materialized
+        table relies on.
+        """
+        if product_ids is None:
+            product_filter = quant_filter = move_filter = SQL("TRUE")
+        else:
+            product_ids = list(product_ids)
+            product_filter = SQL("pp.id = ANY(%s)", product_ids)
+            quant_filter = SQL("sq.product_id = ANY(%s)", product_ids)
+            move_filter = SQL("sm.product_id = ANY(%s)", product_ids)
+        return SQL("""
+            WITH stock_data AS (
+                SELECT
+                    stock.product_id,
+                    SUM(stock.quantity) FILTER (WHERE stock.kind = 'quant') AS qty_available,
+                    SUM(stock.reserved) FILTER (WHERE stock.kind = 'quant') AS reserved_qty,
+                    SUM(stock.quantity) FILTER (WHERE stock.kind = 'in') AS incoming_qty,
+                    SUM(stock.quantity) FILTER (WHERE stock.kind = 'out') AS outgoing_qty
+                FROM (
+                    SELECT sq.product_id, 'quant' AS kind, sq.quantity, sq.reserved_quantity AS reserved
                     FROM stock_quant sq
                     JOIN stock_location sl ON sq.location_id = sl.id
-                    WHERE sl.usage = 'internal'
-                    GROUP BY sq.product_id
-                ),
-                incoming_data AS (
-                    SELECT
-                        product_id,
-                        SUM(product_qty) as incoming_qty
-                    FROM stock_move
-                    WHERE state IN ('assigned', 'confirmed', 'waiting')
-                      AND location_dest_id IN (SELECT id FROM stock_location WHERE usage = 'internal')
-                      AND location_id NOT IN (SELECT id FROM stock_location WHERE usage = 'internal')
-                    GROUP BY product_id
-                ),
-                outgoing_data AS (
+                    WHERE sl.usage = 'internal' AND %(quant_filter)s
+                    UNION ALL
                     SELECT
-                        product_id,
-                        SUM(product_qty) as outgoing_qty
-                    FROM stock_move
-                    WHERE state IN ('assigned', 'confirmed', 'waiting')
-                      AND location_id IN (SELECT id FROM stock_location WHERE usage = 'internal')
-                      AND location_dest_id NOT IN (SELECT id FROM stock_location WHERE usage = 'internal')
-                    GROUP BY product_id
-                )
-                SELECT
-                    ROW_NUMBER() OVER() AS id,
-                    pp.id AS product_id,
-                    pt.id AS product_tmpl_id,
-                    pt.name AS product_name,
-                    pp.default_code AS default_code,
-                    pa.id AS attribute_id,
-                    pa.name AS attribute_name,
-                    pav.id AS attribute_value_id,
-                    pav.name AS attribute_value,
-                    COALESCE(sd.qty_available, 0) AS qty_available,
-                    COALESCE(sd.qty_available, 0) + COALESCE(id.incoming_qty, 0) - COALESCE(od.outgoing_qty, 0) AS virtual_available,
-                    COALESCE(id.incoming_qty, 0) AS incoming_qty, 
-                    COALESCE(od.outgoing_qty, 0) AS outgoing_qty,
-                    COALESCE(sd.reserved_qty, 0) AS reserved_qty,
-                    pt.uom_id AS uom_id
-                FROM product_product pp
-                JOIN product_template pt ON pp.product_tmpl_id = pt.id
-                LEFT JOIN product_template_attribute_value ptav ON ptav.product_tmpl_id = pt.id AND ptav.product_attribute_value_id IS NOT NULL
-                LEFT JOIN product_attribute_value pav ON ptav.product_attribute_value_id = pav.id
-                LEFT JOIN product_attribute pa ON pav.attribute_id = pa.id
-                LEFT JOIN stock_data sd ON pp.id = sd.product_id
-                LEFT JOIN incoming_data id ON pp.id = id.product_id
-                LEFT JOIN outgoing_data od ON pp.id = od.product_id
-                WHERE pt.active = true AND pt.type = 'product'
+                        sm.product_id,
+                        CASE WHEN dest.usage = 'internal' THEN 'in' ELSE 'out' END,
+                        sm.product_qty,
+                        0
+                    FROM stock_move sm
+                    JOIN stock_location src ON sm.location_id = src.id
+                    JOIN stock_location dest ON sm.location_dest_id = dest.id
+                    WHERE sm.state IN %(states)s
+                      AND (src.usage = 'internal') <> (dest.usage = 'internal')
+                      AND %(move_filter)s
+                ) stock
+                GROUP BY stock.product_id
             )
-        """ % self._table)
+            SELECT
+                pp.id AS product_id,
+                pt.id AS product_tmpl_id,
+                pt.name AS product_name,
+                pp.default_code AS default_code,
+                pa.id AS attribute_id,
+                pa.name AS attribute_name,
+                pav.id AS attribute_value_id,
+                pav.name AS attribute_value,
+                COALESCE(sd.qty_available, 0) AS qty_available,
+                COALESCE(sd.qty_available, 0) + COALESCE(sd.incoming_qty, 0) - COALESCE(sd.outgoing_qty, 0) AS virtual_available,
+                COALESCE(sd.incoming_qty, 0) AS incoming_qty,
+                COALESCE(sd.outgoing_qty, 0) AS outgoing_qty,
+                COALESCE(sd.reserved_qty, 0) AS reserved_qty,
+                pt.uom_id AS uom_id
+            FROM product_product pp
+            JOIN product_template pt ON pp.product_tmpl_id = pt.id
+            LEFT JOIN product_template_attribute_value ptav ON ptav.product_tmpl_id = pt.id AND ptav.product_attribute_value_id IS NOT NULL
+            LEFT JOIN product_attribute_value pav ON ptav.product_attribute_value_id = pav.id
+            LEFT JOIN product_attribute pa ON pav.attribute_id = pa.id
+            LEFT JOIN stock_data sd ON pp.id = sd.product_id
+            WHERE pt.active = true AND pt.type = 'product' AND %(product_filter)s
+            """,
+            states=PENDING_MOVE_STATES,
+            quant_filter=quant_filter,
+            move_filter=move_filter,
+            product_filter=product_filter,
+        )
+
+    def _create_report_view(self):
+        """(Re)create the report as a plain view computing the rows on read."""
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL("DROP TABLE IF EXISTS %s", SQL.identifier(MATERIALIZED_TABLE)))
+        self.env.cr.execute(SQL(
+            "CREATE OR REPLACE VIEW %s AS (SELECT ROW_NUMBER() OVER() AS id, report.* FROM (%s) report)",
+            SQL.identifier(self._table),
+            self._get_report_query(),
+        ))
+
+    def _rebuild_materialized_table(self):
+        """
+        Fully rebuild the materialized backing table and point the report
+        view at it.
+        """
+        cr = self.env.cr
+        table = SQL.identifier(MATERIALIZED_TABLE)
+        tools.drop_view_if_exists(cr, self._table)
+        cr.execute(SQL("DROP TABLE IF EXISTS %s", table))
+        cr.execute(SQL("CREATE TABLE %s AS %s", table, self._get_report_query()))
+        cr.execute(SQL("ALTER TABLE %s ADD COLUMN id SERIAL PRIMARY KEY", table))
+        for column in ('product_id', 'product_tmpl_id', 'attribute_id', 'attribute_value_id'):
+            cr.execute(SQL(
+                "CREATE INDEX %s ON %s (%s)",
+                SQL.identifier(f'{MATERIALIZED_TABLE}_{column}_index'),
+                table,
+                SQL.identifier(column),
+            ))
+        cr.execute(SQL(
+            "CREATE OR REPLACE VIEW %s AS (SELECT * FROM %s)",
+            SQL.identifier(self._table),
+            table,
+        ))
+        _logger.info("Rebuilt materialized table %s", MATERIALIZED_TABLE)
+
+    def _refresh_materialized_rows(self, product_ids):
+        """Recompute the materialized rows of the given variants."""
+        if not product_ids or not tools.table_exists(self.env.cr, MATERIALIZED_TABLE):
+            return
+        table = SQL.identifier(MATERIALIZED_TABLE)
+        product_ids = list(product_ids)
+        self.env.cr.execute(SQL("DELETE FROM %s WHERE product_id = ANY(%s)", table, product_ids))
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO %s (product_id, product_tmpl_id, product_name, default_code,
+                            attribute_id, attribute_name, attribute_value_id, attribute_value,
+                            qty_available, virtual_available, incoming_qty, outgoing_qty,
+                            reserved_qty, uom_id)
+            %s
+            """,
+            table,
+            self._get_report_query(product_ids),
+        ))
+
+    @api.model
+    def action_rebuild_materialized_table(self):
+        """Recovery command: rebuild the report storage from scratch."""
+        if not self.env.user.has_group('stock.group_stock_manager'):
+            raise AccessError(_("Only inventory managers can rebuild the stock report storage."))
+        self.env['stock.quant'].flush_model()
+        self.env['stock.move'].flush_model()
+        if self._is_materialized():
+            self._rebuild_materialized_table()
+        else:
+            self._create_report_view()
+        return True
+
+    @api.model
+    def _notify_stock_change(self, product_ids):
+        """
+        Called when quants or moves of ``product_ids`` change. Invalidates
+        the cached report data right away; the changed variants are then
+        processed once per transaction, right before it commits.
+        """
+        if not product_ids:
+            return
+        self.env['stock.report.cache']._bump_generation('stock')
+        pending = self.env.cr.precommit.data.setdefault(CHANGED_PRODUCTS_KEY, set())
+        if not pending:
+            report = self.sudo()
+
+            def process_stock_changes():
+                report._process_stock_changes(
+                    report.env.cr.precommit.data.pop(CHANGED_PRODUCTS_KEY, set())
+                )
+            self.env.cr.precommit.add(process_stock_changes)
+        pending.update(product_ids)
+
+    @api.model
+    def _notify_catalog_change(self, product_ids):
+        """
+        Called when variants of ``product_ids`` are created, removed, renamed,
+        archived or change attribute values. Their materialized rows are
+        refreshed once per transaction, right before it commits.
+        """
+        if not product_ids or not self._is_materialized():
+            return
+        pending = self.env.cr.precommit.data.setdefault(CATALOG_PRODUCTS_KEY, set())
+        if not pending:
+            report = self.sudo()
+
+            def process_catalog_changes():
+                report._refresh_materialized_rows(
+                    report.env.cr.precommit.data.pop(CATALOG_PRODUCTS_KEY, set())
+                )
+            self.env.cr.precommit.add(process_catalog_changes)
+        pending.update(product_ids)
+
+    def _process_stock_changes(self, product_ids):
+        """
+        Refresh the materialized rows of the changed variants and record
+        them for the delta sync of open report views.
+        """
+        if not product_ids:
+            return
+        if self._is_materialized():
+            self._refresh_materialized_rows(product_ids)
+        self.env['stock.report.change']._log_changes(product_ids)
+
+    @api.model
+    def get_report_delta(self, config_id, variant_ids, token):
+        """
+        Return the stock of the ``variant_ids`` whose quantities changed
+        since ``token`` (the ``sync_token`` of a previous response).
+
+        ``reset`` is set when the token is unknown or too old to compute a
+        delta, in which case the caller should reload the page.
+        """
+        config = self.env['stock.report.config'].browse(config_id)
+        if not config.exists():
+            return {'reset': True, 'token': False, 'variants': {}}
+        change_model = self.env['stock.report.change']
+        changed_ids, new_token = change_model._get_changes(variant_ids, token)
+        if changed_ids is None:
+            return {'reset': True, 'token': new_token, 'variants': {}}
+
+        buckets = [(bucket_id, path) for bucket_id, _name, path in config._get_location_buckets()]
+        stock_data = self._get_stock_data(
+            changed_ids, config.use_forecast, buckets, horizons=config._get_forecast_horizons(),
+        )
+        return {
+            'reset': False,
+            'token': new_token,
+            'variants': {
+                variant_id: self._get_variant_quantities(stock, config.use_forecast)
+                for variant_id, stock in stock_data.items()
+            },
+        }
 
     @api.model
     def get_report_data_by_config(self, config_id):
-        """Get report data based on configuration ID with pagination support using read_group"""
+        """
+        Get report data based on configuration ID with (keyset) pagination support.
+
+        Results are cached per configuration and request parameters until
+        stock, products or the configuration change; ``params['refresh']``
+        bypasses the cache and stores a fresh result.
+
+        Without ``refresh``, a cache miss is served from the pages stored by
+        the precomputation job (see ``stock.report.precomputed``) when they
+        match, with their age and staleness in the ``precomputed`` key of the
+        response, before falling back to computing the page.
+
+        With ``params['debug']`` (or instrumentation enabled system-wide, see
+        ``stock.report.timing``) every stage is timed, and ``params['debug']``
+        also returns the measures in the ``timings`` key of the response.
+        """
+        params = self.env.context.get('params', {})
         try:
             config = self.env['stock.report.config'].browse(config_id)
             if not config.exists():
                 return self._get_empty_response()
 
-            params = self.env.context.get('params', {})
-            page = max(1, int(params.get('page', 1)))
-            page_size = max(1, int(params.get('page_size', 20)))
-            search_term = (params.get('search_term', '') or '').strip()
-            
-            # Get the use_forecast setting from the config
-            use_forecast = config.use_forecast
+            options = self._get_report_options(params)
+            timing = self.env['stock.report.timing']
+            timer = timing._get_timer(params)
 
-            domain = self._get_search_domain(config, search_term)
+            cache = self.env['stock.report.cache']
+            with timer.stage('cache'):
+                cache_key = cache._make_key(
+                    'report_data', config.id, config.write_date, config._get_horizon_date(), self.env.lang,
+                    tuple(self.env.companies.ids), tuple(options.items()),
+                )
+                result = None if params.get('refresh') else cache._get(cache_key)
+            cache_hit = result is not None
+            if not cache_hit and not params.get('refresh'):
+                with timer.stage('precomputed'):
+                    result = self.env['stock.report.precomputed']._get_result(config, options)
+            if result is None:
+                result = self._get_report_data(config, options, timer)
+            if not cache_hit:
+                cache._set(cache_key, result)
+            response = dict(result, cache={'hit': cache_hit, **cache.get_cache_stats().get('report_data', {})})
 
-            total_count = self.env['product.template'].search_count(domain)
-            total_pages = (total_count + page_size - 1) // page_size if total_count else 1
+            timing._record(config, options, timer, cache_hit)
+            if params.get('debug'):
+                response['timings'] = timer.summary()
+            return response
+
+        except Exception as e:
+            _logger.exception("Error in get_report_data_by_config (config %s, params %s)", config_id, params)
+            return {
+                'error': str(e),
+                'products': [],
+                'attributes': [],
+                'pagination': {'total': 0, 'page': 1, 'page_size': 20, 'pages': 1}
+            }
+
+    def _get_report_options(self, params):
+        """Normalize the request ``params`` of get_report_data_by_config."""
+        filter_type = params.get('filter_type') or 'all'
+        if filter_type != 'all' and filter_type not in FILTER_TYPES:
+            raise UserError(_("Unknown filter type: %s", filter_type))
+        response_format = params.get('format') or 'default'
+        if response_format not in RESPONSE_FORMATS:
+            raise UserError(_("Unknown response format: %s", response_format))
+        cursor = params.get('cursor')
+        return {
+            'page': max(1, int(params.get('page', 1))),
+            'page_size': max(1, int(params.get('page_size', 20))),
+            'search_term': (params.get('search_term', '') or '').strip(),
+            'pivot': bool(params.get('pivot')),
+            'filter_type': filter_type,
+            # Keyset pagination: [name, id] of the last template of the previous page
+            'cursor': tuple(cursor) if cursor else None,
+            'as_of': self._parse_as_of(params.get('as_of')),
+            'format': response_format,
+        }
 
-            offset = (page - 1) * page_size
-            product_templates = self.env['product.template'].search(
-                domain, 
-                order='name',
-                limit=page_size,
-                offset=offset
+    def _parse_as_of(self, value):
+        """
+        UTC datetime of the ``as_of`` request parameter, ``None`` for the
+        current stock. A date alone means the end of that day in the user's
+        timezone.
+        """
+        if not value:
+            return None
+        try:
+            as_of = fields.Datetime.to_datetime(value)
+        except ValueError:
+            raise UserError(_("Invalid date: %s", value))
+        if len(value) == len('YYYY-MM-DD'):
+            user_tz = pytz.timezone(self.env.user.tz or 'UTC')
+            end_of_day = user_tz.localize(datetime.combine(as_of.date(), time.max))
+            as_of = end_of_day.astimezone(pytz.utc).replace(tzinfo=None)
+        if as_of >= fields.Datetime.now():
+            return None
+        return as_of
+
+    def _get_report_data(self, config, options, timer=None):
+        """
+        Compute one page of the report described by ``options``, measuring
+        its stages with ``timer`` (a ``ReportTimer``) when given.
+        """
+        if timer is None:
+            timer = ReportTimer(self.env.cr, enabled=False)
+        page = options['page']
+        page_size = options['page_size']
+        filter_type = options['filter_type']
+
+        # Get the use_forecast setting from the config
+        use_forecast = config.use_forecast
+
+        domain = self._get_search_domain(config)
+        offset = (page - 1) * page_size
+
+        cache = self.env['stock.report.cache']
+        counts_key = cache._make_key(
+            'filter_counts', config.id, config.write_date, options['search_term'],
+            options['as_of'], self.env.lang, tuple(self.env.companies.ids),
+        )
+        cached_counts = cache._get(counts_key)
+        with timer.stage('template_page') as stage:
+            template_ids, filter_counts, next_cursor = self._get_template_page(
+                config, domain, filter_type, limit=page_size, offset=offset,
+                cursor=options['cursor'], with_counts=cached_counts is None,
+                search_term=options['search_term'], as_of=options['as_of'],
             )
+            stage['rows'] = len(template_ids)
+        if cached_counts is None:
+            cache._set(counts_key, filter_counts)
+        else:
+            filter_counts = cached_counts
+        total_count = filter_counts[filter_type]
+        total_pages = (total_count + page_size - 1) // page_size if total_count else 1
 
-            if not product_templates:
-                return self._get_empty_response()
+        sync_token = self.env['stock.report.change']._get_token()
+        if not template_ids:
+            return dict(self._get_empty_response(), filter_counts=filter_counts, sync_token=sync_token)
+        product_templates = self.env['product.template'].browse(template_ids)
 
+        with timer.stage('variants') as stage:
             variants = self.env['product.product'].search([
                 ('product_tmpl_id', 'in', product_templates.ids)
             ])
+            stage['rows'] = len(variants)
+
+        buckets = config._get_location_buckets()
+        # projections only make sense from the current stock
+        horizons = [] if options['as_of'] else config._get_forecast_horizons()
+        with timer.stage('stock') as stage:
+            stock_data = self._get_stock_data(
+                variants.ids, use_forecast, [(bucket_id, path) for bucket_id, _name, path in buckets],
+                as_of=options['as_of'], horizons=horizons,
+            )
+            stage['rows'] = len(stock_data)
 
-            stock_data = self._get_stock_data(variants.ids, use_forecast)
-            attributes = self._get_attribute_data([config.primary_attribute_id, config.secondary_attribute_id])
+        with timer.stage('products') as stage:
             products_data = self._prepare_products_data(
                 product_templates, 
                 variants, 
                 stock_data, 
                 config
             )
+            stage['rows'] = len(products_data)
 
-            return {
-                'products': products_data,
-                'attributes': attributes,
-                'pagination': {
-                    'total': total_count,
-                    'page': page,
-                    'page_size': page_size,
-                    'pages': total_pages
+        report_attributes = [config.primary_attribute_id, config.secondary_attribute_id]
+        with timer.stage('attributes') as stage:
+            if options['pivot']:
+                # Only send the attribute values used by the variants of this page
+                used_value_ids = {
+                    value_id
+                    for product in products_data
+                    for variant in product['variants']
+                    for value_id in variant['attributes'].values()
                 }
-            }
+                attributes = self._get_attribute_data(report_attributes, used_value_ids)
+            else:
+                attributes = self._get_attribute_data(report_attributes)
+            stage['rows'] = sum(len(attribute['values']) for attribute in attributes)
 
-        except Exception as e:
-            _logger.error("Error in get_report_data_by_config: %s", str(e))
-            return {
-                'error': str(e),
-                'products': [],
-                'attributes': [],
-                'pagination': {'total': 0, 'page': 1, 'page_size': 20, 'pages': 1}
+        if options['pivot']:
+            with timer.stage('pivot') as stage:
+                self._add_attribute_pivots(products_data, config)
+                stage['rows'] = len(products_data)
+
+        if options['format'] == 'compact':
+            products_data = self._get_compact_products_data(products_data, config)
+
+        return {
+            'products': products_data,
+            'attributes': attributes,
+            'filter_counts': filter_counts,
+            'sync_token': sync_token,
+            'locations': [{'id': bucket_id, 'name': name} for bucket_id, name, _path in buckets],
+            'as_of': options['as_of'] and fields.Datetime.to_string(options['as_of']),
+            'horizons': horizons,
+            'pagination': {
+                'total': total_count,
+                'page': page,
+                'page_size': page_size,
+                'pages': total_pages,
+                'next_cursor': next_cursor,
             }
+        }
 
     def _get_empty_response(self):
         return {
@@ -163,8 +509,17 @@ class ProductAttributeReport(models.Model):
             'pagination': {'total': 0, 'page': 1, 'page_size': 20, 'pages': 1}
         }
 
-    def _get_search_domain(self, config, search_term):
-        domain = [('type', '=', 'product'), ('active', '=', True)]
+    def _get_search_domain(self, config):
+        """
+        Domain of the templates shown by ``config``; searching is done in SQL.
+        The company condition matches the product multi-company rule, which
+        superuser calls (the precomputation job) would otherwise skip.
+        """
+        domain = [
+            ('type', '=', 'product'),
+            ('active', '=', True),
+            ('company_id', 'in', [False] + self.env.companies.ids),
+        ]
 
         if config.primary_attribute_id or config.secondary_attribute_id:
             domain.append('|')
@@ -173,110 +528,300 @@ class ProductAttributeReport(models.Model):
             if config.secondary_attribute_id:
                 domain.append(('attribute_line_ids.attribute_id', '=', config.secondary_attribute_id.id))
 
-        if search_term:
-            domain.append('|')
-            domain.append(('name', 'ilike', search_term))
-            domain.append(('default_code', 'ilike', search_term))
-
         return domain
 
-    def _get_stock_data(self, variant_ids, use_forecast=False):
+    def _get_template_page(self, config, domain, filter_type='all', limit=None, offset=0,
+                           cursor=None, with_counts=True, search_term='', as_of=None):
         """
-        Get detailed stock data for variants, including correct incoming and outgoing quantities.
-        If use_forecast is True, virtual_available will be calculated as:
-        qty_available + incoming_qty - outgoing_qty
-        """
-        stock_data = {}
-        
-        # Initialize stock data structure for all variants to ensure consistency
-        for variant_id in variant_ids:
-            stock_data[variant_id] = {
-                'qty_available': 0.0,
-                'reserved_qty': 0.0,
-                'incoming_qty': 0.0,
-                'outgoing_qty': 0.0,
-                'virtual_available': 0.0
-            }
+        Select one page of templates matching ``domain`` and ``search_term``,
+        with the config filters (``filter_zero``, ``include_negative``) and
+        ``filter_type`` evaluated in SQL against per-variant stock before
+        LIMIT is applied.
 
-        # Get quants data (on-hand quantities)
-        quant_data = self.env['stock.quant'].read_group(
-            [
-                ('product_id', 'in', variant_ids),
-                ('location_id.usage', '=', 'internal')
-            ],
-            ['product_id', 'quantity:sum', 'reserved_quantity:sum'],
-            ['product_id']
-        )
+        Templates are ordered by (name, id), preceded by their similarity to
+        ``search_term`` when searching with pg_trgm. When ``cursor`` is given
+        it holds the sort values of the last template of the previous page
+        (``[name, id]`` or ``[-similarity, name, id]``) and the page starts
+        right after it, regardless of ``offset``.
 
-        for item in quant_data:
-            product_id = item['product_id'][0]
-            qty_available = item['quantity'] or 0.0
-            reserved_qty = item['reserved_quantity'] or 0.0
-            
-            stock_data[product_id].update({
-                'qty_available': qty_available,
-                'reserved_qty': reserved_qty,
-                'virtual_available': qty_available  # Initialize with on-hand qty
-            })
+        Returns a tuple ``(template_ids, filter_counts, next_cursor)``:
+        ``filter_counts`` holds the number of matching templates for every
+        filter type (``None`` unless ``with_counts``) and ``next_cursor`` is
+        the cursor of the next page, or ``False`` on the last page.
 
-        # Get incoming moves - all expected incoming stock
-        incoming_domain = [
-            ('product_id', 'in', variant_ids),
-            ('state', 'in', ['assigned', 'confirmed', 'waiting']),
-            ('location_dest_id.usage', '=', 'internal'),
-            ('location_id.usage', '!=', 'internal')
-        ]
-        
-        incoming_data = self.env['stock.move'].read_group(
-            incoming_domain,
-            ['product_id', 'product_qty:sum'],
-            ['product_id']
+        With ``as_of`` the filters are evaluated on the stock at that date.
+        """
+        template_query = self.env['product.template']._search(domain)
+        search = self.env['stock.report.search']
+        sort_columns = [search._get_name_sql('pt')]
+        if search_term:
+            use_trigram = search._has_trigram()
+            template_query.add_where(
+                search._get_search_condition(template_query.table, search_term, use_trigram)
+            )
+            rank = search._get_search_rank('pt', search_term, use_trigram)
+            if rank:
+                # best matches first
+                sort_columns.insert(0, SQL("-%s", rank))
+        sort_key = SQL(", ").join([*sort_columns, SQL("pt.id")])
+        sort_aliases = [f'sort_{index}' for index in range(len(sort_columns))]
+        sort_select = SQL(", ").join(
+            SQL("%s AS %s", column, SQL.identifier(alias))
+            for column, alias in zip(sort_columns, sort_aliases)
         )
 
-        for item in incoming_data:
-            product_id = item['product_id'][0]
-            incoming_qty = item['product_qty'] or 0.0
-            stock_data[product_id]['incoming_qty'] = incoming_qty
-            
-            if use_forecast:
-                stock_data[product_id]['virtual_available'] += incoming_qty
-
-        # Get outgoing moves - all expected outgoing stock 
-        outgoing_domain = [
-            ('product_id', 'in', variant_ids),
-            ('state', 'in', ['assigned', 'confirmed', 'waiting']),
-            ('location_id.usage', '=', 'internal'),
-            ('location_dest_id.usage', '!=', 'internal')
-        ]
-        
-        outgoing_data = self.env['stock.move'].read_group(
-            outgoing_domain,
-            ['product_id', 'product_qty:sum'],
-            ['product_id']
-        )
+        page_conditions = [SQL("TRUE")]
+        if filter_type != 'all':
+            page_conditions.append(SQL.identifier('rt', FILTER_TYPES[filter_type]))
+        if cursor and len(cursor) == len(sort_columns) + 1:
+            page_conditions.append(SQL("(%s) > %s", sort_key, tuple(cursor)))
+            offset = 0
+        page_condition = SQL(" AND ").join(page_conditions)
+        # fetch one extra row to know whether there is a next page
+        fetch_limit = limit + 1 if limit else None
 
-        for item in outgoing_data:
-            product_id = item['product_id'][0]
-            outgoing_qty = item['product_qty'] or 0.0
-            stock_data[product_id]['outgoing_qty'] = outgoing_qty
-            
-            if use_forecast:
-                stock_data[product_id]['virtual_available'] -= outgoing_qty
-
-        # For products that don't have any inventory records, ensure we return the structure
-        for variant_id in variant_ids:
-            if variant_id not in stock_data:
-                stock_data[variant_id] = {
-                    'qty_available': 0.0,
-                    'reserved_qty': 0.0,
-                    'incoming_qty': 0.0,
-                    'outgoing_qty': 0.0,
-                    'virtual_available': 0.0
-                }
+        config_conditions = [SQL("TRUE")]
+        if config.filter_zero:
+            config_conditions.append(SQL("NOT bool_and(rvs.qty = 0)"))
+        if not config.include_negative:
+            config_conditions.append(SQL("NOT bool_or(rvs.qty < 0)"))
+
+        if not with_counts and filter_type == 'all' and len(config_conditions) == 1:
+            # No stock predicate: walk the templates directly, no aggregation
+            self.env.cr.execute(SQL("""
+                SELECT pt.id, %(sort_select)s
+                  FROM product_template pt
+                 WHERE pt.id IN %(templates)s
+                   AND EXISTS (SELECT 1 FROM product_product pp
+                                WHERE pp.product_tmpl_id = pt.id AND pp.active)
+                   AND %(page_condition)s
+              ORDER BY %(sort_key)s
+                 LIMIT %(limit)s OFFSET %(offset)s
+                """,
+                sort_select=sort_select,
+                sort_key=sort_key,
+                templates=template_query.subselect(),
+                page_condition=page_condition,
+                limit=fetch_limit,
+                offset=offset,
+            ))
+            page_rows = self.env.cr.fetchall()
+            filter_counts = None
+        else:
+            display_qty = SQL("COALESCE(rs.qty_available, 0)")
+            if config.use_forecast:
+                display_qty = SQL(
+                    "%s + COALESCE(rs.incoming_qty, 0) - COALESCE(rs.outgoing_qty, 0)", display_qty
+                )
+            counts = SQL(", ").join([
+                SQL("COUNT(*)"),
+                *(SQL("COUNT(*) FILTER (WHERE %s)", SQL.identifier('rt', column))
+                  for column in FILTER_TYPES.values()),
+            ])
+            if with_counts:
+                counts_cte = SQL("report_counts AS (SELECT %s FROM report_templates rt)", counts)
+            else:
+                counts_cte = SQL("report_counts AS (SELECT)")
+
+            self.env.cr.execute(SQL("""
+                WITH report_variants AS (
+                    SELECT pp.id, pp.product_tmpl_id
+                      FROM product_product pp
+                     WHERE pp.active AND pp.product_tmpl_id IN %(templates)s
+                ),
+                report_stock AS (%(stock)s),
+                report_variant_stock AS (
+                    SELECT rv.id,
+                           rv.product_tmpl_id,
+                           %(display_qty)s AS qty,
+                           COALESCE(rs.reserved_qty, 0) AS reserved_qty,
+                           COALESCE(rs.incoming_qty, 0) AS incoming_qty,
+                           COALESCE(rs.outgoing_qty, 0) AS outgoing_qty
+                      FROM report_variants rv
+                 LEFT JOIN report_stock rs ON rs.product_id = rv.id
+                ),
+                report_templates AS (
+                    SELECT rvs.product_tmpl_id AS id,
+                           bool_or(rvs.qty < 0) AS has_negative,
+                           bool_or(rvs.qty = 0) AS has_zero,
+                           bool_or(rvs.qty > 0) AS has_positive,
+                           bool_or(rvs.reserved_qty > 0) AS has_reserved,
+                           bool_or(rvs.incoming_qty > 0) AS has_incoming,
+                           bool_or(rvs.outgoing_qty > 0) AS has_outgoing
+                      FROM report_variant_stock rvs
+                  GROUP BY rvs.product_tmpl_id
+                    HAVING %(config_conditions)s
+                ),
+                %(counts_cte)s
+                SELECT page.*, report_counts.*
+                  FROM report_counts
+             LEFT JOIN LATERAL (
+                        SELECT pt.id, %(sort_select)s
+                          FROM report_templates rt
+                          JOIN product_template pt ON pt.id = rt.id
+                         WHERE %(page_condition)s
+                      ORDER BY %(sort_key)s
+                         LIMIT %(limit)s OFFSET %(offset)s
+                       ) page ON TRUE
+              ORDER BY %(page_order)s
+                """,
+                templates=template_query.subselect(),
+                stock=self.env['stock.report.aggregator']._get_stock_query(
+                    SQL("SELECT id FROM report_variants"), as_of=as_of,
+                ),
+                display_qty=display_qty,
+                config_conditions=SQL(" AND ").join(config_conditions),
+                counts_cte=counts_cte,
+                sort_select=sort_select,
+                sort_key=sort_key,
+                page_order=SQL(", ").join(
+                    SQL.identifier('page', column) for column in [*sort_aliases, 'id']
+                ),
+                page_condition=page_condition,
+                limit=fetch_limit,
+                offset=offset,
+            ))
+            rows = self.env.cr.fetchall()
+            page_width = len(sort_columns) + 1
+            filter_counts = dict(zip(['all', *FILTER_TYPES], rows[0][page_width:])) if with_counts else None
+            page_rows = [row[:page_width] for row in rows if row[0]]
+
+        next_cursor = False
+        if limit and len(page_rows) > limit:
+            page_rows = page_rows[:limit]
+            # sort values followed by the id
+            next_cursor = [*page_rows[-1][1:], page_rows[-1][0]]
+        return [row[0] for row in page_rows], filter_counts, next_cursor
 
-        return stock_data
+    def _get_dashboard_counts(self, configs):
+        """
+        Count, for every config of ``configs``, the templates and variants it
+        shows in total and for each filter type, in a single statement over
+        the configs' attribute lines and the stock of all their variants.
+
+        Template counts match the ``filter_counts`` of the report. Variant
+        counts cover the variants of these templates. Returns
+        ``{config_id: {'templates': {filter_type: count}, 'variants': {...}}}``
+        with the filter types of ``FILTER_TYPES`` and ``'all'``.
+        """
+        if not configs:
+            return {}
+        attributes = configs.primary_attribute_id | configs.secondary_attribute_id
+        template_query = self.env['product.template']._search([
+            ('type', '=', 'product'),
+            ('active', '=', True),
+            ('attribute_line_ids.attribute_id', 'in', attributes.ids),
+        ])
+        self.env['product.template.attribute.line'].flush_model(['product_tmpl_id', 'attribute_id', 'active'])
+        self.env['product.product'].flush_model(['product_tmpl_id', 'active'])
 
-    def _get_attribute_data(self, attributes):
+        def count_array(alias):
+            return SQL("ARRAY[%s]", SQL(", ").join([
+                SQL("COUNT(*)"),
+                *(SQL("COUNT(*) FILTER (WHERE %s)", SQL.identifier(alias, flag)) for flag in FILTER_TYPES.values()),
+            ]))
+
+        self.env.cr.execute(SQL("""
+            WITH report_configs AS (
+                SELECT *
+                  FROM unnest(%(ids)s::int[], %(primary)s::int[], %(secondary)s::int[],
+                              %(use_forecast)s::bool[], %(filter_zero)s::bool[], %(include_negative)s::bool[])
+                    AS config(id, primary_attribute_id, secondary_attribute_id,
+                              use_forecast, filter_zero, include_negative)
+            ),
+            config_templates AS (
+                SELECT DISTINCT rc.id AS config_id, ptal.product_tmpl_id
+                  FROM report_configs rc
+                  JOIN product_template_attribute_line ptal
+                    ON ptal.attribute_id IN (rc.primary_attribute_id, rc.secondary_attribute_id)
+                   AND ptal.active
+                 WHERE ptal.product_tmpl_id IN %(templates)s
+            ),
+            report_variants AS (
+                SELECT pp.id, pp.product_tmpl_id
+                  FROM product_product pp
+                 WHERE pp.active AND pp.product_tmpl_id IN (SELECT product_tmpl_id FROM config_templates)
+            ),
+            report_stock AS (%(stock)s),
+            config_variant_stock AS (
+                SELECT ct.config_id, rv.product_tmpl_id,
+                       COALESCE(rs.qty_available, 0) + CASE WHEN rc.use_forecast
+                           THEN COALESCE(rs.incoming_qty, 0) - COALESCE(rs.outgoing_qty, 0)
+                           ELSE 0 END AS qty,
+                       COALESCE(rs.reserved_qty, 0) AS reserved_qty,
+                       COALESCE(rs.incoming_qty, 0) AS incoming_qty,
+                       COALESCE(rs.outgoing_qty, 0) AS outgoing_qty
+                  FROM config_templates ct
+                  JOIN report_configs rc ON rc.id = ct.config_id
+                  JOIN report_variants rv ON rv.product_tmpl_id = ct.product_tmpl_id
+             LEFT JOIN report_stock rs ON rs.product_id = rv.id
+            ),
+            config_variants AS (
+                SELECT config_id, product_tmpl_id, qty, %(variant_flags)s
+                  FROM config_variant_stock
+            ),
+            config_template_flags AS (
+                SELECT cv.config_id, cv.product_tmpl_id, %(template_flags)s,
+                       NOT ((rc.filter_zero AND bool_and(cv.qty = 0))
+                            OR (NOT rc.include_negative AND bool_or(cv.qty < 0))) AS shown
+                  FROM config_variants cv
+                  JOIN report_configs rc ON rc.id = cv.config_id
+              GROUP BY cv.config_id, cv.product_tmpl_id, rc.filter_zero, rc.include_negative
+            )
+            SELECT rc.id,
+                   (SELECT %(template_counts)s
+                      FROM config_template_flags t
+                     WHERE t.config_id = rc.id AND t.shown),
+                   (SELECT %(variant_counts)s
+                      FROM config_variants cv
+                      JOIN config_template_flags t
+                        ON t.config_id = cv.config_id AND t.product_tmpl_id = cv.product_tmpl_id
+                     WHERE cv.config_id = rc.id AND t.shown)
+              FROM report_configs rc
+            """,
+            ids=configs.ids,
+            primary=[config.primary_attribute_id.id for config in configs],
+            secondary=[config.secondary_attribute_id.id for config in configs],
+            use_forecast=[config.use_forecast for config in configs],
+            filter_zero=[config.filter_zero for config in configs],
+            include_negative=[config.include_negative for config in configs],
+            templates=template_query.subselect(),
+            stock=self.env['stock.report.aggregator']._get_stock_query(SQL("SELECT id FROM report_variants")),
+            variant_flags=SQL(", ").join(
+                SQL("%s AS %s", SQL(condition), SQL.identifier(flag))
+                for flag, condition in VARIANT_FLAG_CONDITIONS.items()
+            ),
+            template_flags=SQL(", ").join(
+                SQL("bool_or(%s) AS %s", SQL.identifier('cv', flag), SQL.identifier(flag))
+                for flag in VARIANT_FLAG_CONDITIONS
+            ),
+            template_counts=count_array('t'),
+            variant_counts=count_array('cv'),
+        ))
+        filter_types = ['all', *FILTER_TYPES]
+        return {
+            config_id: {
+                'templates': dict(zip(filter_types, template_counts)),
+                'variants': dict(zip(filter_types, variant_counts)),
+            }
+            for config_id, template_counts, variant_counts in self.env.cr.fetchall()
+        }
+
+    def _get_stock_data(self, variant_ids, use_forecast=False, buckets=None, as_of=None, horizons=None):
+        """
+        Get detailed stock data for variants, including correct incoming and outgoing quantities.
+        If use_forecast is True, virtual_available will be calculated as:
+        qty_available + incoming_qty - outgoing_qty
+        ``buckets`` adds the per-location breakdown, ``as_of`` returns the
+        stock at that date and ``horizons`` adds projections at these numbers
+        of days, see ``stock.report.aggregator``.
+        """
+        return self.env['stock.report.aggregator']._get_stock_quantities(
+            variant_ids, use_forecast, buckets, as_of, horizons,
+        )
+
+    def _get_attribute_data(self, attributes, value_ids=None):
+        """Attributes with their values, restricted to ``value_ids`` when given."""
         return [{
             'id': attr.id,
             'name': attr.name,
@@ -284,69 +829,102 @@ class ProductAttributeReport(models.Model):
                 'id': val.id,
                 'name': val.name,
                 'display_name': val.display_name
-            } for val in attr.value_ids]
+            } for val in attr.value_ids if value_ids is None or val.id in value_ids]
         } for attr in attributes if attr]
 
+    def _add_attribute_pivots(self, products_data, config):
+        """
+        Add to each product a ready-to-render ``pivot`` of its variants:
+        ``rows`` and ``columns`` hold the primary and secondary value ids in
+        use (in attribute value order) and ``cells`` maps
+        ``"<primary value id>,<secondary value id>"`` to the variant id.
+        Products without any variant carrying both attributes get ``False``.
+        """
+        primary_key = str(config.primary_attribute_id.id)
+        secondary_key = str(config.secondary_attribute_id.id)
+        value_order = {
+            value.id: index
+            for attr in (config.primary_attribute_id, config.secondary_attribute_id)
+            for index, value in enumerate(attr.value_ids)
+        }
+
+        def sort_key(value_id):
+            # archived values are not in value_ids, keep them last
+            return value_order.get(value_id, len(value_order)), value_id
+
+        for product in products_data:
+            rows, columns, cells = set(), set(), {}
+            for variant in product['variants']:
+                primary_value = variant['attributes'].get(primary_key)
+                secondary_value = variant['attributes'].get(secondary_key)
+                if not (primary_value and secondary_value):
+                    continue
+                rows.add(primary_value)
+                columns.add(secondary_value)
+                cells[f'{primary_value},{secondary_value}'] = variant['id']
+
+            product['pivot'] = cells and {
+                'rows': sorted(rows, key=sort_key),
+                'columns': sorted(columns, key=sort_key),
+                'cells': cells,
+            } or False
+
     def _prepare_products_data(self, product_templates, variants, stock_data, config):
         """
         Prepare detailed product data for the report, respecting the config settings.
         Handles both standard and forecasted quantities correctly.
+
+        Variants are grouped by template in one pass and their attribute
+        values and image presence are fetched in bulk, so the number of
+        queries does not depend on the page size.
         """
         products_data = []
         use_forecast = config.use_forecast
+        image_field = config.image_size or 'image_128'
+
+        variants_by_template = defaultdict(list)
+        for variant in variants:
+            variants_by_template[variant.product_tmpl_id.id].append(variant)
+        variant_attributes = self._get_variants_attributes(variants.ids)
+        templates_with_image, variants_with_image = self._get_image_presence(
+            product_templates.ids, variants.ids
+        )
 
         for template in product_templates:
-            template_variants = variants.filtered(lambda v: v.product_tmpl_id == template)
+            template_variants = variants_by_template.get(template.id)
             
             # Skip processing if no variants were found
             if not template_variants:
                 continue
-                
-            # Apply filters based on configuration
-            if config.filter_zero:
-                # Check if all variants have zero quantity (based on display mode)
-                qty_field = 'virtual_available' if use_forecast else 'qty_available'
-                if all(
-                    stock_data.get(v.id, {}).get(qty_field, 0) == 0 
-                    for v in template_variants
-                ):
-                    continue
-
-            if not config.include_negative:
-                # Skip if any variant has negative quantity (based on display mode)
-                qty_field = 'virtual_available' if use_forecast else 'qty_available'
-                if any(
-                    stock_data.get(v.id, {}).get(qty_field, 0) < 0 
-                    for v in template_variants
-                ):
-                    continue
 
+            # filter_zero / include_negative are applied in _get_template_page
+            template_has_image = template.id in templates_with_image
+            template_image_url = template_has_image and self._get_image_url(
+                'product.template', template.id, template.write_date, image_field
+            )
             variant_data = []
             for variant in template_variants:
                 stock = stock_data.get(variant.id, {})
-                
-                # Get the appropriate quantity based on the use_forecast setting
-                display_qty = stock.get('virtual_available', 0) if use_forecast else stock.get('qty_available', 0)
+                # A variant without its own image shows the template one
+                has_image = template_has_image or variant.id in variants_with_image
                 
                 variant_data.append({
                     'id': variant.id,
                     'name': variant.name,
                     'default_code': variant.default_code,
-                    'qty_available': stock.get('qty_available', 0),
-                    'virtual_available': stock.get('virtual_available', 0),
-                    'display_qty': display_qty,  # This is what will be displayed
-                    'qty_reserved': stock.get('reserved_qty', 0),
-                    'incoming_qty': stock.get('incoming_qty', 0),
-                    'outgoing_qty': stock.get('outgoing_qty', 0),
-                    'image_url': variant.image_1920 and f'/web/image/product.product/{variant.id}/image_1920' or False,
+                    **self._get_variant_quantities(stock, use_forecast),
+                    'image_url': has_image and self._get_image_url(
+                        # the variant image falls back on the template one
+                        'product.product', variant.id, max(variant.write_date, template.write_date), image_field
+                    ),
                     'product_url': f'/web#id={variant.id}&model=product.product&view_type=form',
-                    'attributes': self._get_variant_attributes(variant)
+                    'attributes': variant_attributes.get(variant.id, {})
                 })
 
             products_data.append({
                 'id': template.id,
                 'name': template.name,
-                'image_url': template.image_1920 and f'/web/image/product.template/{template.id}/image_1920' or False,
+                'image_url': template_image_url,
                 'product_url': f'/web#id={template.id}&model=product.template&view_type=form',
                 'variants': variant_data,
                 'use_forecast': use_forecast  # Pass this to the frontend
@@ -354,8 +932,135 @@ class ProductAttributeReport(models.Model):
 
         return products_data
 
-    def _get_variant_attributes(self, variant):
+    def _get_compact_products_data(self, products_data, config):
+        """
+        Columnar encoding of ``products_data`` for ``params['format'] ==
+        'compact'``, decoded by the report client.
+
+        Templates and variants become dicts of parallel columns, variants
+        being listed template after template (``variant_count`` per
+        template). Quantities are columns under ``variants['quantities']``,
+        nested per horizon and per location bucket like the default format.
+        Attribute values are indexes in the ``attribute_values`` list of
+        ``[attribute_id, value_id]`` pairs. Images are sent as the ``unique``
+        token of their URL, or ``False``, and URLs are built by the client.
+        """
+        value_indexes = {}
+        templates = {'id': [], 'name': [], 'image': [], 'variant_count': [], 'pivot': []}
+        variants = {'id': [], 'name': [], 'default_code': [], 'image': [], 'values': []}
+        quantities = []
+        quantity_keys = [*self._get_variant_quantities({}, config.use_forecast), 'horizons', 'locations']
+
+        for product in products_data:
+            # records are in cache already, reading write_date costs no query
+            template = self.env['product.template'].browse(product['id'])
+            templates['id'].append(product['id'])
+            templates['name'].append(product['name'])
+            templates['image'].append(bool(product['image_url']) and self._get_image_unique(template.write_date))
+            templates['variant_count'].append(len(product['variants']))
+            if 'pivot' in product:
+                templates['pivot'].append(product['pivot'])
+            for variant in product['variants']:
+                record = self.env['product.product'].browse(variant['id'])
+                variants['id'].append(variant['id'])
+                variants['name'].append(variant['name'])
+                variants['default_code'].append(variant['default_code'])
+                variants['image'].append(bool(variant['image_url']) and self._get_image_unique(
+                    max(record.write_date, template.write_date)
+                ))
+                variants['values'].append([
+                    value_indexes.setdefault((int(attribute_id), value_id), len(value_indexes))
+                    for attribute_id, value_id in variant['attributes'].items() if value_id
+                ])
+                quantities.append({key: variant[key] for key in quantity_keys if key in variant})
+
+        if len(templates['pivot']) != len(templates['id']):
+            del templates['pivot']
         return {
-            str(attr.attribute_id.id): attr.product_attribute_value_id.id
-            for attr in variant.product_template_attribute_value_ids
-        }
\ No newline at end of file
+            'format': 'compact',
+            'use_forecast': config.use_forecast,
+            'image_field': config.image_size or 'image_128',
+            'attribute_values': [list(pair) for pair in value_indexes],
+            'templates': templates,
+            'variants': dict(variants, quantities=self._get_quantity_columns(quantities)),
+        }
+
+    def _get_quantity_columns(self, quantities):
+        """Turn a list of variant quantities (see _get_variant_quantities) into columns."""
+        columns = {}
+        for key, value in (quantities[0].items() if quantities else ()):
+            if key == 'horizons':
+                columns[key] = {days: [qty[key][days] for qty in quantities] for days in value}
+            elif key == 'locations':
+                columns[key] = {
+                    bucket_id: self._get_quantity_columns([qty[key][bucket_id] for qty in quantities])
+                    for bucket_id in value
+                }
+            else:
+                columns[key] = [qty[key] for qty in quantities]
+        return columns
+
+    def _get_variant_quantities(self, stock, use_forecast):
+        """Quantity fields of a variant in the report response."""
+        quantities = {
+            'qty_available': stock.get('qty_available', 0),
+            'virtual_available': stock.get('virtual_available', 0),
+            # Get the appropriate quantity based on the use_forecast setting
+            'display_qty': stock.get('virtual_available', 0) if use_forecast else stock.get('qty_available', 0),
+            'qty_reserved': stock.get('reserved_qty', 0),
+            'incoming_qty': stock.get('incoming_qty', 0),
+            'outgoing_qty': stock.get('outgoing_qty', 0),
+        }
+        if 'horizons' in stock:
+            quantities['horizons'] = dict(stock['horizons'])
+        if 'locations' in stock:
+            quantities['locations'] = {
+                bucket_id: self._get_variant_quantities(bucket_stock, use_forecast)
+                for bucket_id, bucket_stock in stock['locations'].items()
+            }
+        return quantities
+
+    def _get_image_url(self, model, record_id, write_date, image_field):
+        """
+        URL of a product image in the configured size. The ``unique`` key
+        changes with ``write_date``, letting the browser cache the image
+        until the record is modified.
+        """
+        return f'/web/image/{model}/{record_id}/{image_field}?unique={self._get_image_unique(write_date)}'
+
+    def _get_image_unique(self, write_date):
+        return fields.Datetime.to_string(write_date).translate(str.maketrans('', '', '- :'))
+
+    def _get_variants_attributes(self, variant_ids):
+        """Map each variant id to ``{str(attribute_id): attribute_value_id}`` in one query."""
+        self.env['product.product'].flush_model(['product_template_attribute_value_ids'])
+        self.env['product.template.attribute.value'].flush_model(['attribute_id', 'product_attribute_value_id'])
+        self.env.cr.execute(SQL("""
+            SELECT pvc.product_product_id, ptav.attribute_id, ptav.product_attribute_value_id
+              FROM product_variant_combination pvc
+              JOIN product_template_attribute_value ptav ON ptav.id = pvc.product_template_attribute_value_id
+             WHERE pvc.product_product_id = ANY(%s)
+            """, list(variant_ids)))
+        variant_attributes = defaultdict(dict)
+        for variant_id, attribute_id, value_id in self.env.cr.fetchall():
+            variant_attributes[variant_id][str(attribute_id)] = value_id
+        return variant_attributes
+
+    def _get_image_presence(self, template_ids, variant_ids):
+        """
+        Return the sets of template ids and variant ids having their own
+        image, read from the attachment metadata without loading the images.
+        """
+        self.env.cr.execute(SQL("""
+            SELECT res_model, res_id
+              FROM ir_attachment
+             WHERE (res_model = 'product.template' AND res_field = 'image_1920' AND res_id = ANY(%s))
+                OR (res_model = 'product.product' AND res_field = 'image_variant_1920' AND res_id = ANY(%s))
+            """, list(template_ids), list(variant_ids)))
+        templates_with_image, variants_with_image = set(), set()
+        for res_model, res_id in self.env.cr.fetchall():
+            if res_model == 'product.template':
+                templates_with_image.add(res_id)
+            else:
+                variants_with_image.add(res_id)
+        return templates_with_image, variants_with_image
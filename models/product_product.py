@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Variant fields read by the report; other writes (e.g. standard_price on
+# every AVCO receipt) keep cached pages valid.
+REPORT_PRODUCT_FIELDS = {
+    'name', 'default_code', 'active', 'type', 'company_id', 'product_tmpl_id', 'uom_id',
+    'product_template_attribute_value_ids', 'image_1920', 'image_variant_1920',
+}
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(products.ids)
+        return products
+
+    def write(self, vals):
+        if not REPORT_PRODUCT_FIELDS.intersection(vals):
+            return super().write(vals)
+        result = super().write(vals)
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(self.ids)
+        return result
+
+    def unlink(self):
+        product_ids = self.ids
+        result = super().unlink()
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(product_ids)
+        return result
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Template fields read by the report.
+REPORT_TEMPLATE_FIELDS = {
+    'name', 'default_code', 'active', 'type', 'company_id', 'uom_id', 'attribute_line_ids',
+    'image_1920', 'image_1024', 'image_512', 'image_256', 'image_128',
+}
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def _get_report_variant_ids(self):
+        """Ids of all variants of the templates, archived ones included."""
+        return self.with_context(active_test=False).product_variant_ids.ids
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        templates = super().create(vals_list)
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(templates._get_report_variant_ids())
+        return templates
+
+    def write(self, vals):
+        if not REPORT_TEMPLATE_FIELDS.intersection(vals):
+            return super().write(vals)
+        result = super().write(vals)
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(self._get_report_variant_ids())
+        return result
+
+    def unlink(self):
+        product_ids = self._get_report_variant_ids()
+        result = super().unlink()
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(product_ids)
+        return result
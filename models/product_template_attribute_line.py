@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Attribute line fields read by the report.
+REPORT_LINE_FIELDS = {'attribute_id', 'value_ids', 'active', 'product_tmpl_id'}
+
+
+class ProductTemplateAttributeLine(models.Model):
+    _inherit = 'product.template.attribute.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['stock.report.cache']._bump_generation('catalog')
+        self.env['product.attribute.report']._notify_catalog_change(lines.product_tmpl_id._get_report_variant_ids())
+        return lines
+
+    def write(self, vals):
+        if not REPORT_LINE_FIELDS.intersection(vals):
+            return super().write(vals)
+        templates = self.product_tmpl_id
+        product_ids = set(templates._get_report_variant_ids())
+        result = super().write(vals)
+        self.env['stock.report.cache']._bump_generation('catalog')
+        product_ids.update((templates | self.product_tmpl_id)._get_report_variant_ids())
+        self.env['product.attribute.report']._notify_catalog_change(product_ids)
+        return result
+
+    def unlink(self):
+        templates = self.product_tmpl_id
+        product_ids = set(templates._get_report_variant_ids())
+        result = super().unlink()
+        self.env['stock.report.cache']._bump_generation('catalog')
+        product_ids.update(templates.exists()._get_report_variant_ids())
+        self.env['product.attribute.report']._notify_catalog_change(product_ids)
+        return result
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Move fields whose change affects the report quantities (date: forecast horizons).
+REPORT_MOVE_FIELDS = {
+    'product_id', 'location_id', 'location_dest_id', 'state',
+    'product_uom_qty', 'product_uom', 'company_id', 'date',
+}
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        self.env['product.attribute.report']._notify_stock_change(moves.product_id.ids)
+        return moves
+
+    def write(self, vals):
+        if not REPORT_MOVE_FIELDS.intersection(vals):
+            return super().write(vals)
+        product_ids = set(self.product_id.ids)
+        result = super().write(vals)
+        product_ids.update(self.product_id.ids)
+        self.env['product.attribute.report']._notify_stock_change(product_ids)
+        return result
+
+    def unlink(self):
+        product_ids = self.product_id.ids
+        result = super().unlink()
+        self.env['product.attribute.report']._notify_stock_change(product_ids)
+        return result
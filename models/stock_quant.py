@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Quant fields whose change affects the report quantities.
+REPORT_QUANT_FIELDS = {'product_id', 'location_id', 'quantity', 'reserved_quantity', 'company_id'}
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        quants = super().create(vals_list)
+        self.env['product.attribute.report']._notify_stock_change(quants.product_id.ids)
+        return quants
+
+    def write(self, vals):
+        if not REPORT_QUANT_FIELDS.intersection(vals):
+            return super().write(vals)
+        product_ids = set(self.product_id.ids)
+        result = super().write(vals)
+        product_ids.update(self.product_id.ids)
+        self.env['product.attribute.report']._notify_stock_change(product_ids)
+        return result
+
+    def unlink(self):
+        product_ids = self.product_id.ids
+        result = super().unlink()
+        self.env['product.attribute.report']._notify_stock_change(product_ids)
+        return result
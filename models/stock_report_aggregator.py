@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Move states counted as expected incoming/outgoing stock.
+PENDING_MOVE_STATES = ('assigned', 'confirmed', 'waiting')
+
+
+class StockReportAggregator(models.AbstractModel):
+    _name = 'stock.report.aggregator'
+    _description = 'Stock Report Aggregator'
+
+    @api.model
+    def _get_internal_location_ids(self):
+        """Ids of the internal locations visible to the current user.
+
+        Archived locations are included, matching what a ``location_id.usage``
+        domain resolves to.
+        """
+        return self.env['stock.location'].with_context(active_test=False).search([
+            ('usage', '=', 'internal'),
+        ]).ids
+
+    @api.model
+    def _get_product_condition(self, column, products):
+        """Restrict ``column`` to ``products``: a list of ids or an SQL subquery."""
+        if isinstance(products, SQL):
+            return SQL("%s IN (%s)", column, products)
+        return SQL("%s = ANY(%s)", column, list(products))
+
+    @api.model
+    def _get_bucket_locations_query(self, buckets, internal_location_ids):
+        """
+        Statement mapping every internal location to its bucket, as rows
+        ``(location_id, bucket_id)``; see :meth:`_get_stock_breakdown_query`.
+        """
+        self.env['stock.location'].flush_model(['parent_path'])
+        return SQL("""
+            SELECT sl.id AS location_id,
+                   (SELECT bucket.bucket_id
+                      FROM unnest(%(bucket_ids)s::int[], %(bucket_paths)s::varchar[]) AS bucket(bucket_id, parent_path)
+                     WHERE starts_with(sl.parent_path, bucket.parent_path)
+                  ORDER BY length(bucket.parent_path) DESC
+                     LIMIT 1) AS bucket_id
+              FROM stock_location sl
+             WHERE sl.id = ANY(%(internal)s)
+            """,
+            bucket_ids=[bucket_id for bucket_id, _path in buckets],
+            bucket_paths=[path for _bucket_id, path in buckets],
+            internal=internal_location_ids,
+        )
+
+    @api.model
+    def _get_stock_query(self, products, internal_location_ids=None, as_of=None):
+        """
+        Build the single statement aggregating stock per product.
+
+        Quants and pending moves are read in one pass and split with
+        conditional aggregates, returning one row per product having stock
+        or pending moves with the columns ``product_id``, ``qty_available``,
+        ``reserved_qty``, ``incoming_qty`` and ``outgoing_qty``.
+
+        With ``as_of`` the on-hand quantity at that date is computed from the
+        stock snapshots instead, the other columns being zero.
+        """
+        if as_of:
+            return SQL("""
+                SELECT lq.product_id, SUM(lq.quantity) AS qty_available,
+                       0.0 AS reserved_qty, 0.0 AS incoming_qty, 0.0 AS outgoing_qty
+                  FROM (%s) lq
+              GROUP BY lq.product_id
+                """,
+                self.env['stock.report.snapshot']._get_location_quantities_query(
+                    products, as_of, internal_location_ids,
+                ),
+            )
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'quantity', 'reserved_quantity', 'company_id'])
+        self.env['stock.move'].flush_model(['product_id', 'location_id', 'location_dest_id', 'state', 'product_qty', 'company_id'])
+        if internal_location_ids is None:
+            internal_location_ids = self._get_internal_location_ids()
+        company_ids = self.env.companies.ids
+        return SQL("""
+            SELECT stock.product_id,
+                   COALESCE(SUM(stock.quantity) FILTER (WHERE stock.kind = 'quant'), 0) AS qty_available,
+                   COALESCE(SUM(stock.reserved) FILTER (WHERE stock.kind = 'quant'), 0) AS reserved_qty,
+                   COALESCE(SUM(stock.quantity) FILTER (WHERE stock.kind = 'in'), 0) AS incoming_qty,
+                   COALESCE(SUM(stock.quantity) FILTER (WHERE stock.kind = 'out'), 0) AS outgoing_qty
+              FROM (
+                    SELECT sq.product_id, 'quant' AS kind, sq.quantity, sq.reserved_quantity AS reserved
+                      FROM stock_quant sq
+                     WHERE %(quant_products)s
+                       AND sq.location_id = ANY(%(internal)s)
+                       AND sq.company_id = ANY(%(companies)s)
+                    UNION ALL
+                    SELECT sm.product_id,
+                           CASE WHEN sm.location_dest_id = ANY(%(internal)s) THEN 'in' ELSE 'out' END,
+                           sm.product_qty, 0
+                      FROM stock_move sm
+                     WHERE %(move_products)s
+                       AND sm.state IN %(states)s
+                       AND sm.company_id = ANY(%(companies)s)
+                       AND (sm.location_id = ANY(%(internal)s)) <> (sm.location_dest_id = ANY(%(internal)s))
+                   ) stock
+             GROUP BY stock.product_id
+            """,
+            quant_products=self._get_product_condition(SQL('sq.product_id'), products),
+            move_products=self._get_product_condition(SQL('sm.product_id'), products),
+            internal=internal_location_ids,
+            companies=company_ids,
+            states=PENDING_MOVE_STATES,
+        )
+
+    @api.model
+    def _get_stock_breakdown_query(self, products, buckets, internal_location_ids=None, as_of=None):
+        """
+        Variant of :meth:`_get_stock_query` also splitting stock per bucket
+        of locations, in the same pass thanks to GROUPING SETS.
+
+        ``buckets`` is a list of ``(bucket_id, parent_path)``: an internal
+        location belongs to the bucket with the longest ``parent_path``
+        prefix of its own, so nested buckets are counted once. Each product
+        gets a total row (``bucket_id`` NULL), equal to the result of
+        :meth:`_get_stock_query`, and one row per bucket it has stock or
+        pending moves in. Moves between two buckets count as outgoing for one
+        and incoming for the other, but are ignored by the total. ``as_of``
+        works as in :meth:`_get_stock_query`.
+        """
+        if internal_location_ids is None:
+            internal_location_ids = self._get_internal_location_ids()
+        locations = self._get_bucket_locations_query(buckets, internal_location_ids)
+        if as_of:
+            return SQL("""
+                SELECT lq.product_id, rl.bucket_id, GROUPING(rl.bucket_id) = 1 AS is_total,
+                       SUM(lq.quantity) AS qty_available,
+                       0.0 AS reserved_qty, 0.0 AS incoming_qty, 0.0 AS outgoing_qty
+                  FROM (%s) lq
+                  JOIN (%s) rl ON rl.location_id = lq.location_id
+              GROUP BY GROUPING SETS ((lq.product_id, rl.bucket_id), (lq.product_id))
+                HAVING GROUPING(rl.bucket_id) = 1 OR rl.bucket_id IS NOT NULL
+                """,
+                self.env['stock.report.snapshot']._get_location_quantities_query(
+                    products, as_of, internal_location_ids,
+                ),
+                locations,
+            )
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'quantity', 'reserved_quantity', 'company_id'])
+        self.env['stock.move'].flush_model(['product_id', 'location_id', 'location_dest_id', 'state', 'product_qty', 'company_id'])
+
+        def measure(column, kind):
+            return SQL("""
+                CASE WHEN GROUPING(stock.bucket_id) = 1
+                     THEN COALESCE(SUM(%(column)s) FILTER (WHERE stock.kind = %(kind)s AND stock.for_total), 0)
+                     ELSE COALESCE(SUM(%(column)s) FILTER (WHERE stock.kind = %(kind)s AND stock.for_bucket), 0)
+                END""", column=column, kind=kind)
+
+        return SQL("""
+            WITH report_locations AS (%(locations)s)
+            SELECT stock.product_id,
+                   stock.bucket_id,
+                   GROUPING(stock.bucket_id) = 1 AS is_total,
+                   %(qty_available)s AS qty_available,
+                   %(reserved_qty)s AS reserved_qty,
+                   %(incoming_qty)s AS incoming_qty,
+                   %(outgoing_qty)s AS outgoing_qty
+              FROM (
+                    SELECT sq.product_id, rl.bucket_id, 'quant' AS kind, sq.quantity, sq.reserved_quantity AS reserved,
+                           rl.bucket_id IS NOT NULL AS for_bucket, TRUE AS for_total
+                      FROM stock_quant sq
+                      JOIN report_locations rl ON rl.location_id = sq.location_id
+                     WHERE %(quant_products)s
+                       AND sq.company_id = ANY(%(companies)s)
+                    UNION ALL
+                    SELECT sm.product_id, side.bucket_id, side.kind, sm.product_qty, 0, side.for_bucket, side.for_total
+                      FROM stock_move sm
+                 LEFT JOIN report_locations src ON src.location_id = sm.location_id
+                 LEFT JOIN report_locations dest ON dest.location_id = sm.location_dest_id
+                CROSS JOIN LATERAL (VALUES
+                           ('out', src.bucket_id,
+                            src.bucket_id IS NOT NULL AND src.bucket_id IS DISTINCT FROM dest.bucket_id,
+                            src.location_id IS NOT NULL AND dest.location_id IS NULL),
+                           ('in', dest.bucket_id,
+                            dest.bucket_id IS NOT NULL AND dest.bucket_id IS DISTINCT FROM src.bucket_id,
+                            dest.location_id IS NOT NULL AND src.location_id IS NULL)
+                           ) AS side(kind, bucket_id, for_bucket, for_total)
+                     WHERE %(move_products)s
+                       AND sm.state IN %(states)s
+                       AND sm.company_id = ANY(%(companies)s)
+                       AND (src.location_id IS NOT NULL OR dest.location_id IS NOT NULL)
+                   ) stock
+          GROUP BY GROUPING SETS ((stock.product_id, stock.bucket_id), (stock.product_id))
+            HAVING GROUPING(stock.bucket_id) = 1 OR stock.bucket_id IS NOT NULL
+            """,
+            locations=locations,
+            qty_available=measure(SQL('stock.quantity'), 'quant'),
+            reserved_qty=measure(SQL('stock.reserved'), 'quant'),
+            incoming_qty=measure(SQL('stock.quantity'), 'in'),
+            outgoing_qty=measure(SQL('stock.quantity'), 'out'),
+            quant_products=self._get_product_condition(SQL('sq.product_id'), products),
+            move_products=self._get_product_condition(SQL('sm.product_id'), products),
+            companies=self.env.companies.ids,
+            states=PENDING_MOVE_STATES,
+        )
+
+    @api.model
+    def _get_horizon_query(self, products, horizons, internal_location_ids=None):
+        """
+        Statement projecting pending moves over ``horizons`` (sorted numbers
+        of days from now) in one pass.
+
+        Each move falls in the first horizon its scheduled date is within,
+        overdue moves in the first one and moves past the last horizon are
+        ignored. Returns rows ``(product_id, days, net_qty)`` where ``net_qty``
+        is the cumulated incoming minus outgoing quantity up to ``days``, for
+        the horizons a product has moves in.
+        """
+        self.env['stock.move'].flush_model(['product_id', 'location_id', 'location_dest_id', 'state', 'product_qty', 'company_id', 'date'])
+        if internal_location_ids is None:
+            internal_location_ids = self._get_internal_location_ids()
+        now = fields.Datetime.now()
+        return SQL("""
+            WITH horizon AS (
+                SELECT * FROM unnest(%(days)s::int[], %(ends)s::timestamp[]) AS h(days, date_end)
+            ),
+            horizon_moves AS (
+                SELECT sm.product_id,
+                       (SELECT MIN(h.days) FROM horizon h WHERE sm.date <= h.date_end) AS days,
+                       CASE WHEN sm.location_dest_id = ANY(%(internal)s) THEN sm.product_qty ELSE -sm.product_qty END AS qty
+                  FROM stock_move sm
+                 WHERE %(products)s
+                   AND sm.state IN %(states)s
+                   AND sm.company_id = ANY(%(companies)s)
+                   AND (sm.location_id = ANY(%(internal)s)) <> (sm.location_dest_id = ANY(%(internal)s))
+                   AND sm.date <= %(last_end)s
+            )
+            SELECT product_id, days,
+                   SUM(SUM(qty)) OVER (PARTITION BY product_id ORDER BY days) AS net_qty
+              FROM horizon_moves
+          GROUP BY product_id, days
+            """,
+            days=list(horizons),
+            ends=[now + timedelta(days=days) for days in horizons],
+            last_end=now + timedelta(days=horizons[-1]),
+            internal=internal_location_ids,
+            products=self._get_product_condition(SQL('sm.product_id'), products),
+            companies=self.env.companies.ids,
+            states=PENDING_MOVE_STATES,
+        )
+
+    @api.model
+    def _get_stock_quantities(self, product_ids, use_forecast=False, buckets=None, as_of=None, horizons=None):
+        """
+        Return on-hand, reserved, incoming, outgoing and forecast quantities
+        for ``product_ids`` as ``{product_id: {...}}``.
+
+        Every requested product gets an entry, zero-filled when it has no
+        stock. ``virtual_available`` is the on-hand quantity, adjusted by the
+        incoming and outgoing quantities when ``use_forecast`` is set.
+
+        With ``buckets`` (see :meth:`_get_stock_breakdown_query`) each entry
+        also holds the same quantities per bucket under ``locations``, every
+        bucket being present. With ``as_of`` the quantities are those at
+        that date, see :meth:`_get_stock_query`. With ``horizons`` (sorted
+        numbers of days) each entry holds the on-hand quantity projected at
+        each of them under ``horizons``, see :meth:`_get_horizon_query`.
+        """
+        stock_data = {
+            product_id: self._get_empty_quantities()
+            for product_id in product_ids
+        }
+        if buckets:
+            for quantities in stock_data.values():
+                quantities['locations'] = {
+                    bucket_id: self._get_empty_quantities() for bucket_id, _path in buckets
+                }
+        if not product_ids:
+            return stock_data
+
+        if buckets:
+            self.env.cr.execute(self._get_stock_breakdown_query(product_ids, buckets, as_of=as_of))
+        else:
+            self.env.cr.execute(SQL(
+                "SELECT stock.product_id, NULL, TRUE, stock.qty_available, stock.reserved_qty,"
+                " stock.incoming_qty, stock.outgoing_qty FROM (%s) stock",
+                self._get_stock_query(product_ids, as_of=as_of),
+            ))
+        for product_id, bucket_id, is_total, qty_available, reserved_qty, incoming_qty, outgoing_qty in self.env.cr.fetchall():
+            virtual_available = qty_available
+            if use_forecast:
+                virtual_available += incoming_qty - outgoing_qty
+            quantities = {
+                'qty_available': qty_available,
+                'reserved_qty': reserved_qty,
+                'incoming_qty': incoming_qty,
+                'outgoing_qty': outgoing_qty,
+                'virtual_available': virtual_available,
+            }
+            if is_total:
+                stock_data[product_id].update(quantities)
+            else:
+                stock_data[product_id]['locations'][bucket_id] = quantities
+
+        if horizons and not as_of:
+            self.env.cr.execute(self._get_horizon_query(product_ids, horizons))
+            net_quantities = defaultdict(dict)
+            for product_id, days, net_qty in self.env.cr.fetchall():
+                net_quantities[product_id][days] = net_qty
+            for product_id, quantities in stock_data.items():
+                product_net, net_qty = net_quantities.get(product_id, {}), 0.0
+                quantities['horizons'] = {}
+                for days in horizons:
+                    # horizons without moves keep the cumulated quantity of the previous one
+                    net_qty = product_net.get(days, net_qty)
+                    quantities['horizons'][days] = quantities['qty_available'] + net_qty
+        return stock_data
+
+    @api.model
+    def _get_empty_quantities(self):
+        return {
+            'qty_available': 0.0,
+            'reserved_qty': 0.0,
+            'incoming_qty': 0.0,
+            'outgoing_qty': 0.0,
+            'virtual_available': 0.0,
+        }
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from odoo import api, models
+from odoo.tools import SQL
+from odoo.tools.lru import LRU
+
+# Generation counters, stored in PostgreSQL sequences so that every worker
+# sees the same value and bumping them never takes a row lock.
+GENERATION_SEQUENCES = {
+    'catalog': 'stock_report_v2_catalog_generation',
+    'stock': 'stock_report_v2_stock_generation',
+}
+
+# Process-wide cache shared by all databases, entries are keyed by db name.
+_report_cache = LRU(512)
+# Hit/miss counters of this process, per database and namespace.
+_cache_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+class StockReportCache(models.AbstractModel):
+    _name = 'stock.report.cache'
+    _description = 'Stock Report Cache'
+
+    def init(self):
+        for sequence in GENERATION_SEQUENCES.values():
+            self.env.cr.execute(SQL("CREATE SEQUENCE IF NOT EXISTS %s", SQL.identifier(sequence)))
+
+    @api.model
+    def _get_generations(self):
+        """Current ``(catalog, stock)`` generations."""
+        self.env.cr.execute(SQL(
+            "SELECT %s",
+            SQL(", ").join(
+                # last_value of a sequence never called is its start value,
+                # which its first nextval() returns too: read it as 0
+                SQL("(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM %s)", SQL.identifier(sequence))
+                for sequence in GENERATION_SEQUENCES.values()
+            ),
+        ))
+        return self.env.cr.fetchone()
+
+    @api.model
+    def _bump_generation(self, kind):
+        """
+        Invalidate every cache entry depending on ``kind`` ('catalog' or
+        'stock'). The counter is bumped right away, so the current
+        transaction stops using stale entries, and again after commit, so
+        entries computed by other workers before the commit are dropped too.
+        """
+        key = f'stock_report_v2.bumped_{kind}'
+        if self.env.cr.postcommit.data.get(key):
+            return
+        self.env.cr.postcommit.data[key] = True
+        query = SQL("SELECT nextval(%s)", GENERATION_SEQUENCES[kind])
+        self.env.cr.execute(query)
+        cr = self.env.cr
+        cr.postcommit.add(lambda: cr.execute(query))
+
+    @api.model
+    def _make_key(self, namespace, *parts, generations=None):
+        """
+        Cache key for ``parts`` in ``namespace``, bound to the database and
+        the current generations.
+        """
+        if generations is None:
+            generations = self._get_generations()
+        return (self.env.cr.dbname, namespace, tuple(generations), *parts)
+
+    @api.model
+    def _get(self, key):
+        value = _report_cache.get(key)
+        stats = _cache_stats[key[:2]]
+        stats['misses' if value is None else 'hits'] += 1
+        return value
+
+    @api.model
+    def _set(self, key, value):
+        _report_cache[key] = value
+        return value
+
+    @api.model
+    def get_cache_stats(self):
+        """Hit/miss counters of the current worker for this database."""
+        dbname = self.env.cr.dbname
+        return {
+            namespace: dict(stats)
+            for (db, namespace), stats in list(_cache_stats.items())
+            if db == dbname
+        }
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Bus channel and notification type used to push stock changes to open reports.
+BUS_CHANNEL = 'stock_report_v2.stock'
+BUS_NOTIFICATION = 'stock_report_v2/stock_changed'
+# Changes are kept this long; older sync tokens require a full reload.
+CHANGE_RETENTION = timedelta(days=1)
+# Rows logged this long before a token are scanned again, to catch
+# transactions that were committing while the token was issued.
+COMMIT_LOOKBACK = timedelta(seconds=5)
+
+
+class StockReportChange(models.Model):
+    _name = 'stock.report.change'
+    _description = 'Stock Report Change'
+    _log_access = False
+    _order = 'id'
+
+    product_id = fields.Many2one('product.product', required=True, index=True, ondelete='cascade')
+    date = fields.Datetime(required=True, index=True)
+
+    @api.model
+    def _log_changes(self, product_ids):
+        """Record that the stock of ``product_ids`` changed and notify open reports."""
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO stock_report_change (product_id, date)
+            SELECT unnest(%s::int[]), clock_timestamp() AT TIME ZONE 'UTC'
+            """,
+            list(product_ids),
+        ))
+        if self.env['stock.report.config'].sudo().search_count([('live_updates', '=', True)], limit=1):
+            self.env['bus.bus']._sendone(BUS_CHANNEL, BUS_NOTIFICATION, {})
+
+    @api.model
+    def _get_token(self):
+        """
+        Sync token identifying the changes logged so far. Its date is the
+        start of the transaction, whose snapshot the report data is read
+        from, however long the call takes.
+        """
+        self.env.cr.execute("""
+            SELECT COALESCE(MAX(id), 0), now() AT TIME ZONE 'UTC'
+              FROM stock_report_change
+        """)
+        last_id, now = self.env.cr.fetchone()
+        return f'{last_id}|{now.isoformat()}'
+
+    @api.model
+    def _get_changes(self, product_ids, token):
+        """
+        Return ``(changed_product_ids, new_token)``: the ids among
+        ``product_ids`` changed since ``token``, or ``None`` when no delta
+        can be computed from ``token``.
+        """
+        new_token = self._get_token()
+        try:
+            last_id, since = token.split('|')
+            last_id, since = int(last_id), datetime.fromisoformat(since)
+        except (AttributeError, ValueError):
+            return None, new_token
+        if since < datetime.utcnow() - CHANGE_RETENTION:
+            return None, new_token
+        if not product_ids:
+            return [], new_token
+
+        self.env.cr.execute(SQL(
+            """
+            SELECT DISTINCT product_id
+              FROM stock_report_change
+             WHERE product_id = ANY(%s)
+               AND (id > %s OR date >= %s)
+            """,
+            list(product_ids), last_id, since - COMMIT_LOOKBACK,
+        ))
+        return [row[0] for row in self.env.cr.fetchall()], new_token
+
+    @api.autovacuum
+    def _gc_changes(self):
+        self.env.cr.execute(SQL(
+            "DELETE FROM stock_report_change WHERE date < %s",
+            datetime.utcnow() - CHANGE_RETENTION,
+        ))
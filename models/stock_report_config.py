@@ -17,6 +17,27 @@ class StockReportConfig(models.Model):
     use_forecast = fields.Boolean(string="Use Forecasted Quantities", default=False)
     filter_zero = fields.Boolean(string="Hide Zero Quantities", default=True)
     include_negative = fields.Boolean(string="Include Negative Quantities", default=True)
+    live_updates = fields.Boolean(string="Live Updates", default=False,
+        help="Push stock changes to open reports, which then only reload the changed quantities.")
+    image_size = fields.Selection([
+        ('image_128', "Thumbnail (128px)"),
+        ('image_256', "Small (256px)"),
+        ('image_512', "Medium (512px)"),
+        ('image_1920', "Full Size"),
+    ], string="Image Size", default='image_128', required=True,
+        help="Size of the product images loaded by the report. Thumbnails are cached by the browser until the product changes.")
+    location_breakdown = fields.Selection([
+        ('none', "Total Only"),
+        ('warehouse', "Per Warehouse"),
+        ('location', "Per Location"),
+    ], string="Location Breakdown", default='none', required=True,
+        help="Also compute the quantities of each warehouse or location, the report can then switch between them without reloading.")
+    warehouse_ids = fields.Many2many('stock.warehouse', string="Warehouses",
+        help="Warehouses of the breakdown, all warehouses of the current companies when empty.")
+    location_ids = fields.Many2many('stock.location', string="Locations", domain=[('usage', '=', 'internal')],
+        help="Locations of the breakdown, each one counting its sublocations except those listed as well.")
+    forecast_horizons = fields.Char(string="Forecast Horizons",
+        help="Comma-separated numbers of days, e.g. 7,30,90. The report can then show the quantity projected at each horizon from the scheduled dates of pending moves.")
     action_id = fields.Many2one('ir.actions.client', string="Client Action", readonly=True, copy=False)
     
     @api.constrains('primary_attribute_id', 'secondary_attribute_id')
@@ -25,6 +46,14 @@ class StockReportConfig(models.Model):
             if record.primary_attribute_id and record.secondary_attribute_id and record.primary_attribute_id == record.secondary_attribute_id:
                 raise models.ValidationError(_("Primary and Secondary attributes cannot be the same."))
     
+    @api.constrains('forecast_horizons')
+    def _check_forecast_horizons(self):
+        for record in self:
+            try:
+                record._get_forecast_horizons()
+            except ValueError:
+                raise models.ValidationError(_("Forecast horizons must be positive numbers of days separated by commas, e.g. 7,30,90."))
+
     @api.model_create_multi
     def create(self, vals_list):
         records = super().create(vals_list)
@@ -34,6 +63,7 @@ class StockReportConfig(models.Model):
     
     def write(self, vals):
         result = super().write(vals)
+        self.env['stock.report.cache']._bump_generation('catalog')
         if any(field in vals for field in ['name', 'primary_attribute_id', 'secondary_attribute_id', 'parent_menu_id']):
             for record in self:
                 if record.menu_id:
@@ -75,7 +105,73 @@ class StockReportConfig(models.Model):
             'sequence': self.sequence,
         })
         self.menu_id = menu.id
+
+    def _get_location_buckets(self):
+        """``[(id, name, parent_path)]`` of the location breakdown, empty without one."""
+        self.ensure_one()
+        if self.location_breakdown == 'warehouse':
+            warehouses = self.warehouse_ids or self.env['stock.warehouse'].search([
+                ('company_id', 'in', self.env.companies.ids),
+            ])
+            return [(warehouse.id, warehouse.name, warehouse.view_location_id.parent_path) for warehouse in warehouses]
+        if self.location_breakdown == 'location':
+            return [(location.id, location.complete_name, location.parent_path) for location in self.location_ids]
+        return []
+
+    def _get_forecast_horizons(self):
+        """Sorted numbers of days of the forecast horizons."""
+        self.ensure_one()
+        horizons = {int(days) for days in (self.forecast_horizons or '').split(',') if days.strip()}
+        if any(days <= 0 for days in horizons):
+            raise ValueError(self.forecast_horizons)
+        return sorted(horizons)
+
+    def _get_horizon_date(self):
+        """
+        UTC day the forecast horizons are counted from, ``False`` without
+        horizons: results projected over horizons are only valid that day.
+        """
+        self.ensure_one()
+        return self._get_forecast_horizons() and fields.Datetime.now().date()
+
+    def _get_export_url(self, file_format='csv'):
+        self.ensure_one()
+        return f'/stock_report_v2/export/{self.id}?file_format={file_format}'
+
+    def action_export_matrix(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': self._get_export_url(self.env.context.get('file_format', 'csv')),
+            'target': 'self',
+        }
         
+    @api.model
+    def get_dashboard_data(self):
+        """
+        Template and variant counts of every active config, in total and per
+        filter type (negative, zero, reserved, ...), to spot the reports
+        needing attention. The counts of all configs come from one query and
+        are cached until stock, products or configs change.
+        """
+        configs = self.search([('active', '=', True)], order='sequence, name')
+        cache = self.env['stock.report.cache']
+        cache_key = cache._make_key(
+            'dashboard', tuple((config.id, config.write_date) for config in configs),
+            tuple(self.env.companies.ids),
+        )
+        counts = cache._get(cache_key)
+        if counts is None:
+            counts = cache._set(cache_key, self.env['product.attribute.report']._get_dashboard_counts(configs))
+        return [{
+            'id': config.id,
+            'name': config.name,
+            'action_id': config.action_id.id,
+            'menu_id': config.menu_id.id,
+            'use_forecast': config.use_forecast,
+            **counts.get(config.id, {'templates': {}, 'variants': {}}),
+        } for config in configs]
+
     @api.model
     def get_available_configs(self):
         configs = self.search([('active', '=', True)], order='sequence, name')
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from odoo import _, api, models
+from odoo.tools import SQL
+
+# Rows fetched at once from the server-side cursor of an export.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class StockReportExport(models.AbstractModel):
+    _name = 'stock.report.export'
+    _description = 'Stock Report Export'
+
+    @api.model
+    def _get_export_columns(self, config):
+        """Values of the secondary attribute, one matrix column each."""
+        return [(value.id, value.name) for value in config.secondary_attribute_id.value_ids]
+
+    @api.model
+    def _get_export_header(self, config):
+        return [
+            _("Product"),
+            config.primary_attribute_id.name,
+            *(name for _value_id, name in self._get_export_columns(config)),
+            _("Total"),
+        ]
+
+    @api.model
+    def _get_export_query(self, config):
+        """
+        Statement returning one row per variant of ``config``, ordered by
+        template and primary value: ``(template_id, template_name,
+        primary_value_id, secondary_value_id, qty)`` where ``qty`` is the
+        quantity displayed by the report. Templates hidden by the config
+        filters are left out.
+        """
+        report = self.env['product.attribute.report']
+        template_query = self.env['product.template']._search(report._get_search_domain(config))
+
+        display_qty = SQL("COALESCE(rs.qty_available, 0)")
+        if config.use_forecast:
+            display_qty = SQL("%s + COALESCE(rs.incoming_qty, 0) - COALESCE(rs.outgoing_qty, 0)", display_qty)
+
+        conditions = [SQL("TRUE")]
+        if config.filter_zero:
+            conditions.append(SQL("NOT all_zero"))
+        if not config.include_negative:
+            conditions.append(SQL("NOT any_negative"))
+
+        return SQL("""
+            WITH report_variants AS (
+                SELECT pp.id, pp.product_tmpl_id
+                  FROM product_product pp
+                 WHERE pp.active AND pp.product_tmpl_id IN %(templates)s
+            ),
+            report_stock AS (%(stock)s),
+            report_rows AS (
+                SELECT pt.id AS template_id,
+                       %(template_name)s AS template_name,
+                       pv.value_id AS primary_value_id,
+                       pv.sequence AS primary_sequence,
+                       sv.value_id AS secondary_value_id,
+                       %(display_qty)s AS qty
+                  FROM report_variants rv
+                  JOIN product_template pt ON pt.id = rv.product_tmpl_id
+             LEFT JOIN report_stock rs ON rs.product_id = rv.id
+             LEFT JOIN LATERAL (%(primary_value)s) pv ON TRUE
+             LEFT JOIN LATERAL (%(secondary_value)s) sv ON TRUE
+            ),
+            report_flags AS (
+                SELECT report_rows.*,
+                       bool_and(qty = 0) OVER template AS all_zero,
+                       bool_or(qty < 0) OVER template AS any_negative
+                  FROM report_rows
+                WINDOW template AS (PARTITION BY template_id)
+            )
+            SELECT template_id, template_name, primary_value_id, secondary_value_id, qty
+              FROM report_flags
+             WHERE %(conditions)s
+          ORDER BY template_name, template_id, primary_sequence, primary_value_id
+            """,
+            templates=template_query.subselect(),
+            stock=self.env['stock.report.aggregator']._get_stock_query(SQL("SELECT id FROM report_variants")),
+            template_name=self.env['stock.report.search']._get_name_sql('pt'),
+            primary_value=self._get_variant_value_query(config.primary_attribute_id),
+            secondary_value=self._get_variant_value_query(config.secondary_attribute_id),
+            display_qty=display_qty,
+            conditions=SQL(" AND ").join(conditions),
+        )
+
+    @api.model
+    def _get_variant_value_query(self, attribute):
+        """Value of ``attribute`` for the variant ``rv``, meant for a LATERAL join."""
+        return SQL("""
+            SELECT ptav.product_attribute_value_id AS value_id, pav.sequence
+              FROM product_variant_combination pvc
+              JOIN product_template_attribute_value ptav ON ptav.id = pvc.product_template_attribute_value_id
+              JOIN product_attribute_value pav ON pav.id = ptav.product_attribute_value_id
+             WHERE pvc.product_product_id = rv.id AND ptav.attribute_id = %s
+             LIMIT 1
+            """, attribute.id)
+
+    @api.model
+    def _iter_matrix_rows(self, config):
+        """
+        Yield the matrix of ``config`` in chunks of rows: one row per
+        (template, primary value) with the quantity of every secondary value
+        and their total.
+
+        Variants are read from a server-side cursor ``EXPORT_CHUNK_SIZE``
+        rows at a time, so memory does not depend on the catalog size.
+        """
+        columns = self._get_export_columns(config)
+        column_index = {value_id: index for index, (value_id, _name) in enumerate(columns)}
+        primary_names = {value.id: value.name for value in config.primary_attribute_id.value_ids}
+
+        cr = self.env.cr
+        cr.execute(SQL(
+            "DECLARE stock_report_export NO SCROLL CURSOR FOR %s",
+            self._get_export_query(config),
+        ))
+        try:
+            current_key, current_row = None, None
+            while True:
+                cr.execute("FETCH FORWARD %s FROM stock_report_export", [EXPORT_CHUNK_SIZE])
+                records = cr.fetchall()
+                if not records:
+                    break
+                chunk = []
+                for template_id, template_name, primary_id, secondary_id, qty in records:
+                    key = (template_id, primary_id)
+                    if key != current_key:
+                        if current_row:
+                            chunk.append(current_row)
+                        current_key = key
+                        current_row = [template_name, primary_names.get(primary_id, ''), *([0.0] * len(columns)), 0.0]
+                    if secondary_id in column_index:
+                        current_row[2 + column_index[secondary_id]] += qty
+                    current_row[-1] += qty
+                yield chunk
+            if current_row:
+                yield [current_row]
+        finally:
+            cr.execute("CLOSE stock_report_export")
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import threading
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+PRECOMPUTE_PAGES_PARAM = 'stock_report_v2.precompute_pages'
+DEFAULT_PRECOMPUTE_PAGES = 20
+# Request params of the pages the report client opens first.
+PRECOMPUTE_PARAMS = {
+    'page_size': 20,
+    'search_term': '',
+    'filter_type': 'all',
+    'pivot': True,
+    'format': 'compact',
+}
+
+
+class StockReportPrecomputed(models.Model):
+    _name = 'stock.report.precomputed'
+    _description = 'Stock Report Precomputed Page'
+    _log_access = False
+
+    config_id = fields.Many2one('stock.report.config', required=True, index=True, ondelete='cascade')
+    lang = fields.Char(required=True)
+    company_key = fields.Char(required=True, help="Comma-separated ids of the companies the page was computed for.")
+    options_key = fields.Char(required=True, help="Report options of the page, as JSON.")
+    data = fields.Json()
+    computed_at = fields.Datetime(required=True)
+    sync_token = fields.Char(help="Stock change token at computation time, see stock.report.change.")
+    catalog_generation = fields.Integer()
+    config_write_date = fields.Datetime()
+
+    _sql_constraints = [
+        ('page_unique', 'unique(config_id, lang, company_key, options_key)',
+         "A report page can only be precomputed once per language and companies."),
+    ]
+
+    @api.model
+    def _get_context_keys(self):
+        return self.env.lang or 'en_US', ','.join(map(str, self.env.companies.ids))
+
+    @api.model
+    def _get_options_key(self, options):
+        return json.dumps(options, sort_keys=True, default=str)
+
+    @api.model
+    def _get_result(self, config, options):
+        """
+        Precomputed report data of ``config`` for ``options`` in the current
+        language and companies, or ``None`` when there is none or when the
+        catalog or the config changed since, or the day for configs with
+        forecast horizons. Stock changes since computation
+        set ``precomputed['stale']`` in the result instead.
+        """
+        lang, company_key = self._get_context_keys()
+        page = self.sudo().search([
+            ('config_id', '=', config.id),
+            ('lang', '=', lang),
+            ('company_key', '=', company_key),
+            ('options_key', '=', self._get_options_key(options)),
+        ], limit=1)
+        if not page or not self._is_current(page, config):
+            return None
+        changed_ids, _token = self.env['stock.report.change']._get_changes(
+            self._get_variant_ids(page.data), page.sync_token,
+        )
+        return dict(page.data, precomputed={
+            'computed_at': fields.Datetime.to_string(page.computed_at),
+            'stale': changed_ids is None or bool(changed_ids),
+        })
+
+    @api.model
+    def _is_current(self, page, config):
+        """Whether ``page`` was computed from the current catalog, config and, with horizons, day."""
+        catalog_generation = self.env['stock.report.cache']._get_generations()[0]
+        horizon_date = config._get_horizon_date()
+        return (
+            page.config_write_date == config.write_date
+            and page.catalog_generation == catalog_generation
+            and (not horizon_date or page.computed_at.date() == horizon_date)
+        )
+
+    @api.model
+    def _get_variant_ids(self, data):
+        products = data.get('products') or []
+        if isinstance(products, dict):
+            return products['variants']['id']
+        return [variant['id'] for product in products for variant in product['variants']]
+
+    @api.model
+    def _get_precompute_user(self, company):
+        """Internal stock user of ``company`` whose access rules pages of ``company`` are computed with."""
+        return self.env['res.users'].sudo().search([
+            ('share', '=', False),
+            ('company_ids', 'in', company.id),
+            ('groups_id', 'in', self.env.ref('stock.group_stock_user').id),
+        ], order='id', limit=1)
+
+    @api.model
+    def _cron_precompute(self):
+        """
+        Precompute the first pages of every active config, per language and
+        company. Pages are computed as a stock user of the company rather than
+        as the cron superuser, so record rules apply as they do live.
+        """
+        configs = self.env['stock.report.config'].search([('active', '=', True)])
+        for company in self.env['res.company'].search([]):
+            user = self._get_precompute_user(company)
+            if not user:
+                _logger.info("No stock user in company %s, its stock report pages are not precomputed", company.id)
+                continue
+            for lang, _name in self.env['res.lang'].get_installed():
+                precomputed = self.with_user(user).with_context(lang=lang, allowed_company_ids=company.ids)
+                for config in configs:
+                    precomputed._precompute_config(config)
+
+    @api.model
+    def _precompute_config(self, config):
+        """
+        Precompute the pages of ``config`` in the current language and
+        companies, unless nothing they depend on changed since the last run.
+
+        Pages are computed one at a time, each one committed on its own, so
+        the job never holds a long transaction; a page size worth of
+        templates is the chunk of work.
+
+        Pages are computed with the access rights of the current user, and
+        stored as superuser.
+        """
+        config = config.with_env(self.env)
+        report = self.env['product.attribute.report']
+        lang, company_key = self._get_context_keys()
+        pages = self.sudo().search([('config_id', '=', config.id), ('lang', '=', lang), ('company_key', '=', company_key)])
+        first_options = report._get_report_options(dict(PRECOMPUTE_PARAMS, page=1))
+        first_page = pages.filtered(lambda page: page.options_key == self._get_options_key(first_options))
+        if first_page and not self._has_changed(first_page, config):
+            return
+
+        # taken before computing, so changes made meanwhile show as stale
+        sync_token = self.env['stock.report.change']._get_token()
+        catalog_generation = self.env['stock.report.cache']._get_generations()[0]
+        max_pages = int(self.env['ir.config_parameter'].sudo().get_param(
+            PRECOMPUTE_PAGES_PARAM, DEFAULT_PRECOMPUTE_PAGES,
+        ))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        kept, cursor = self.sudo().browse(), None
+        for page_number in range(1, max_pages + 1):
+            options = report._get_report_options(dict(PRECOMPUTE_PARAMS, page=page_number, cursor=cursor))
+            data = report._get_report_data(config, options)
+            options_key = self._get_options_key(options)
+            values = {
+                'data': data,
+                'computed_at': fields.Datetime.now(),
+                'sync_token': sync_token,
+                'catalog_generation': catalog_generation,
+                'config_write_date': config.write_date,
+            }
+            page = pages.filtered(lambda page: page.options_key == options_key)
+            if page:
+                page.write(values)
+            else:
+                page = self.sudo().create(dict(
+                    values, config_id=config.id, lang=lang, company_key=company_key, options_key=options_key,
+                ))
+            kept |= page
+            if auto_commit:
+                self.env.cr.commit()
+            cursor = data['pagination'].get('next_cursor')
+            if not cursor:
+                break
+        (pages - kept).unlink()
+        _logger.info("Precomputed %s pages of stock report %s (%s, companies %s)", len(kept), config.id, lang, company_key)
+
+    @api.model
+    def _has_changed(self, page, config):
+        """Whether the report of ``config`` may differ from the precomputed ``page``."""
+        if not self._is_current(page, config):
+            return True
+        report = self.env['product.attribute.report']
+        template_query = self.env['product.template']._search(report._get_search_domain(config))
+        variant_ids = self.env['product.product'].search([('product_tmpl_id', 'in', template_query)]).ids
+        changed_ids, _token = self.env['stock.report.change']._get_changes(variant_ids, page.sync_token)
+        return changed_ids is None or bool(changed_ids)
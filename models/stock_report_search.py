@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+import psycopg2
+
+from odoo import api, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Trigram indexes backing the report search: (index name, table, expression).
+TRIGRAM_INDEXES = [
+    ('stock_report_product_template_name_trgm', 'product_template',
+     "(jsonb_path_query_array(name, '$.*')::text) gin_trgm_ops"),
+    ('stock_report_product_template_code_trgm', 'product_template', "default_code gin_trgm_ops"),
+    ('stock_report_product_product_code_trgm', 'product_product', "default_code gin_trgm_ops"),
+]
+
+
+class StockReportSearch(models.AbstractModel):
+    _name = 'stock.report.search'
+    _description = 'Stock Report Search'
+
+    def init(self):
+        cr = self.env.cr
+        if not self._has_trigram():
+            try:
+                with cr.savepoint(flush=False):
+                    cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except psycopg2.Error:
+                _logger.info("pg_trgm is not available, the stock report search falls back to ILIKE")
+                return
+        for index_name, table, expression in TRIGRAM_INDEXES:
+            cr.execute(SQL(
+                "CREATE INDEX IF NOT EXISTS %s ON %s USING gin (%s)",
+                SQL.identifier(index_name), SQL.identifier(table), SQL(expression),
+            ))
+
+    @api.model
+    def _has_trigram(self):
+        self.env.cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _get_name_sql(self, alias):
+        """Template name in the current language, as the ORM orders it."""
+        return SQL(
+            "COALESCE(%s->>%s, %s->>'en_US')",
+            SQL.identifier(alias, 'name'), self.env.lang or 'en_US', SQL.identifier(alias, 'name'),
+        )
+
+    @api.model
+    def _get_search_condition(self, alias, search_term, use_trigram=None):
+        """
+        Condition on the templates aliased ``alias`` matching ``search_term``
+        in their name, their internal reference or the internal reference of
+        one of their active variants.
+
+        With pg_trgm the name is also matched in the form covered by the
+        trigram index on all its translations, so that every branch of the
+        condition can use an index.
+        """
+        if use_trigram is None:
+            use_trigram = self._has_trigram()
+        pattern = f'%{search_term}%'
+        name_condition = SQL("%s ILIKE %s", self._get_name_sql(alias), pattern)
+        if use_trigram:
+            # translations appear JSON-escaped in the text of the jsonb array,
+            # whose backslashes must be literal in the pattern
+            json_term = json.dumps(search_term, ensure_ascii=False)[1:-1].replace('\\', '\\\\')
+            json_pattern = f'%{json_term}%'
+            name_condition = SQL(
+                "(jsonb_path_query_array(%s, '$.*')::text ILIKE %s AND %s)",
+                SQL.identifier(alias, 'name'), json_pattern, name_condition,
+            )
+        return SQL(
+            """(%s
+                OR %s ILIKE %s
+                OR %s IN (SELECT pp.product_tmpl_id FROM product_product pp
+                           WHERE pp.active AND pp.default_code ILIKE %s))""",
+            name_condition,
+            SQL.identifier(alias, 'default_code'), pattern,
+            SQL.identifier(alias, 'id'), pattern,
+        )
+
+    @api.model
+    def _get_search_rank(self, alias, search_term, use_trigram=None):
+        """
+        Similarity of the templates aliased ``alias`` to ``search_term``,
+        the best of their name, internal reference and variant references.
+        Returns ``None`` when pg_trgm is not available.
+        """
+        if use_trigram is None:
+            use_trigram = self._has_trigram()
+        if not use_trigram:
+            return None
+        return SQL(
+            """GREATEST(
+                word_similarity(%(term)s, %(name)s),
+                word_similarity(%(term)s, COALESCE(%(code)s, '')),
+                (SELECT COALESCE(MAX(word_similarity(%(term)s, pp.default_code)), 0)
+                   FROM product_product pp
+                  WHERE pp.product_tmpl_id = %(id)s AND pp.active)
+            )""",
+            term=search_term,
+            name=self._get_name_sql(alias),
+            code=SQL.identifier(alias, 'default_code'),
+            id=SQL.identifier(alias, 'id'),
+        )
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import AccessError
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+SNAPSHOT_RETENTION_PARAM = 'stock_report_v2.snapshot_retention_days'
+DEFAULT_SNAPSHOT_RETENTION_DAYS = 400
+# Differences below this are rounding noise for the consistency check.
+CONSISTENCY_TOLERANCE = 0.0001
+
+
+class StockReportSnapshot(models.Model):
+    _name = 'stock.report.snapshot'
+    _description = 'Stock Report Snapshot'
+    _log_access = False
+    _order = 'date desc, id'
+
+    date = fields.Datetime(required=True, index=True)
+    product_id = fields.Many2one('product.product', required=True, index=True, ondelete='cascade')
+    location_id = fields.Many2one('stock.location', required=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', required=True, ondelete='cascade')
+    quantity = fields.Float(digits='Product Unit of Measure')
+
+    def _flush_stock(self):
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'quantity', 'company_id'])
+        self.env['stock.move.line'].flush_model([
+            'product_id', 'location_id', 'location_dest_id', 'state', 'date', 'quantity_product_uom', 'company_id',
+        ])
+        self.flush_model()
+
+    @api.model
+    def _get_all_companies_env(self):
+        """Superuser environment spanning every company, for the snapshot jobs."""
+        companies = self.env['res.company'].sudo().search([])
+        return self.sudo().with_context(allowed_company_ids=companies.ids)
+
+    @api.model
+    def _check_manager(self):
+        """The snapshot actions work on every company as superuser, reserve them to inventory managers."""
+        if not self.env.user.has_group('stock.group_stock_manager'):
+            raise AccessError(_("Only inventory managers can rebuild or check the stock snapshots."))
+
+    @api.model
+    def _take_snapshot(self):
+        """
+        Store the current quantity of every variant in every internal location.
+        Locations shared between companies are skipped, as in the live query
+        the past quantities are compared with.
+        """
+        self = self._get_all_companies_env()
+        self._flush_stock()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO stock_report_snapshot (date, product_id, location_id, company_id, quantity)
+            SELECT %(now)s, sq.product_id, sq.location_id, sl.company_id, SUM(sq.quantity)
+              FROM stock_quant sq
+              JOIN stock_location sl ON sl.id = sq.location_id
+             WHERE sq.location_id = ANY(%(internal)s)
+               AND sl.company_id IS NOT NULL
+          GROUP BY sq.product_id, sq.location_id, sl.company_id
+            HAVING SUM(sq.quantity) <> 0
+            """,
+            now=fields.Datetime.now(),
+            internal=self.env['stock.report.aggregator']._get_internal_location_ids(),
+        ))
+
+    @api.model
+    def _cron_take_snapshot(self):
+        self._take_snapshot()
+
+    @api.model
+    def _get_nearest_snapshot_date(self, date):
+        """
+        Base to compute the quantities at ``date`` from: the date of the
+        snapshot closest to it, or ``False`` for the live quants when they
+        are closer than any snapshot.
+        """
+        self.flush_model(['date'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT (SELECT MAX(date) FROM stock_report_snapshot WHERE date <= %(date)s),
+                   (SELECT MIN(date) FROM stock_report_snapshot WHERE date > %(date)s)
+            """,
+            date=date,
+        ))
+        now = fields.Datetime.now()
+        candidates = [base_date for base_date in self.env.cr.fetchone() if base_date] + [False]
+        return min(candidates, key=lambda base_date: abs((base_date or now) - date))
+
+    @api.model
+    def _get_location_quantities_query(self, products, date, internal_location_ids=None, base_date=None):
+        """
+        Statement returning the quantity of ``products`` (a list of ids, an
+        SQL subquery or ``None`` for all of them) in each internal location at
+        ``date``, as rows ``(product_id, location_id, quantity)``.
+
+        Quantities start from the snapshot at ``base_date`` (the live quants
+        when ``False``, the nearest base when ``None``) and the done move
+        lines between both dates are replayed, forward or backward.
+        """
+        self._flush_stock()
+        aggregator = self.env['stock.report.aggregator']
+        if internal_location_ids is None:
+            internal_location_ids = aggregator._get_internal_location_ids()
+        if base_date is None:
+            base_date = self._get_nearest_snapshot_date(date)
+
+        def product_condition(column):
+            if products is None:
+                return SQL("TRUE")
+            return aggregator._get_product_condition(SQL(column), products)
+
+        companies = self.env.companies.ids
+        if base_date:
+            base = SQL(
+                """
+                SELECT s.product_id, s.location_id, s.quantity
+                  FROM stock_report_snapshot s
+                 WHERE s.date = %s AND %s
+                   AND s.location_id = ANY(%s)
+                   AND s.company_id = ANY(%s)
+                """,
+                base_date, product_condition('s.product_id'), internal_location_ids, companies,
+            )
+        else:
+            base = SQL(
+                """
+                SELECT sq.product_id, sq.location_id, sq.quantity
+                  FROM stock_quant sq
+                 WHERE %s
+                   AND sq.location_id = ANY(%s)
+                   AND sq.company_id = ANY(%s)
+                """,
+                product_condition('sq.product_id'), internal_location_ids, companies,
+            )
+
+        if base_date and base_date <= date:
+            sign, window = 1, SQL("sml.date > %s AND sml.date <= %s", base_date, date)
+        elif base_date:
+            sign, window = -1, SQL("sml.date > %s AND sml.date <= %s", date, base_date)
+        else:
+            sign, window = -1, SQL("sml.date > %s", date)
+
+        return SQL(
+            """
+            SELECT replay.product_id, replay.location_id, SUM(replay.quantity) AS quantity
+              FROM (
+                    %(base)s
+                    UNION ALL
+                    SELECT sml.product_id, sml.location_dest_id, %(sign)s * sml.quantity_product_uom
+                      FROM stock_move_line sml
+                     WHERE sml.state = 'done' AND %(window)s AND %(products)s
+                       AND sml.location_dest_id = ANY(%(internal)s)
+                       AND sml.company_id = ANY(%(companies)s)
+                    UNION ALL
+                    SELECT sml.product_id, sml.location_id, -%(sign)s * sml.quantity_product_uom
+                      FROM stock_move_line sml
+                     WHERE sml.state = 'done' AND %(window)s AND %(products)s
+                       AND sml.location_id = ANY(%(internal)s)
+                       AND sml.company_id = ANY(%(companies)s)
+                   ) replay
+          GROUP BY replay.product_id, replay.location_id
+            """,
+            base=base,
+            sign=sign,
+            window=window,
+            products=product_condition('sml.product_id'),
+            internal=internal_location_ids,
+            companies=companies,
+        )
+
+    @api.model
+    def action_rebuild_snapshots(self):
+        """
+        Recompute every stored snapshot from the live quants and the move
+        history, then take a new one.
+        """
+        self._check_manager()
+        self = self._get_all_companies_env()
+        self.flush_model(['date'])
+        self.env.cr.execute("SELECT DISTINCT date FROM stock_report_snapshot ORDER BY date")
+        dates = [row[0] for row in self.env.cr.fetchall()]
+        for date in dates:
+            self.env.cr.execute(SQL(
+                """
+                WITH quantities AS (%(quantities)s),
+                cleared AS (DELETE FROM stock_report_snapshot WHERE date = %(date)s)
+                INSERT INTO stock_report_snapshot (date, product_id, location_id, company_id, quantity)
+                SELECT %(date)s, q.product_id, q.location_id, sl.company_id, q.quantity
+                  FROM quantities q
+                  JOIN stock_location sl ON sl.id = q.location_id
+                 WHERE q.quantity <> 0 AND sl.company_id IS NOT NULL
+                """,
+                quantities=self._get_location_quantities_query(None, date, base_date=False),
+                date=date,
+            ))
+        self._take_snapshot()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'success',
+                'message': _("%s stock snapshots rebuilt.", len(dates)),
+            },
+        }
+
+    @api.model
+    def _check_consistency(self):
+        """
+        Compare the latest snapshot replayed up to now with the live quants.
+        Returns the mismatches as ``(product_id, location_id, replayed, live)``.
+        """
+        self = self._get_all_companies_env()
+        self.flush_model(['date'])
+        self.env.cr.execute("SELECT MAX(date) FROM stock_report_snapshot")
+        base_date = self.env.cr.fetchone()[0]
+        if not base_date:
+            return []
+        aggregator = self.env['stock.report.aggregator']
+        internal_location_ids = aggregator._get_internal_location_ids()
+        self.env.cr.execute(SQL(
+            """
+            SELECT COALESCE(replayed.product_id, live.product_id),
+                   COALESCE(replayed.location_id, live.location_id),
+                   COALESCE(replayed.quantity, 0), COALESCE(live.quantity, 0)
+              FROM (%(replayed)s) replayed
+         FULL JOIN (%(live)s) live
+                ON live.product_id = replayed.product_id AND live.location_id = replayed.location_id
+             WHERE ABS(COALESCE(replayed.quantity, 0) - COALESCE(live.quantity, 0)) > %(tolerance)s
+            """,
+            replayed=self._get_location_quantities_query(
+                None, fields.Datetime.now(), internal_location_ids, base_date=base_date,
+            ),
+            live=self._get_location_quantities_query(
+                None, fields.Datetime.now(), internal_location_ids, base_date=False,
+            ),
+            tolerance=CONSISTENCY_TOLERANCE,
+        ))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def action_check_consistency(self):
+        self._check_manager()
+        mismatches = self._check_consistency()
+        for product_id, location_id, replayed, live in mismatches:
+            _logger.warning(
+                "Stock snapshot mismatch: product %s, location %s: replayed %s, live %s",
+                product_id, location_id, replayed, live,
+            )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'warning' if mismatches else 'success',
+                'sticky': bool(mismatches),
+                'message': _(
+                    "%s quantities differ between the snapshots and the live stock, see the server log. "
+                    "Rebuild the snapshots to fix them.", len(mismatches),
+                ) if mismatches else _("Stock snapshots are consistent with the live stock."),
+            },
+        }
+
+    @api.autovacuum
+    def _gc_snapshots(self):
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            SNAPSHOT_RETENTION_PARAM, DEFAULT_SNAPSHOT_RETENTION_DAYS,
+        ))
+        if days > 0:
+            self.env.cr.execute(SQL(
+                "DELETE FROM stock_report_snapshot WHERE date < %s",
+                fields.Datetime.now() - timedelta(days=days),
+            ))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from odoo import api, models, tools
+
+_logger = logging.getLogger(__name__)
+
+INSTRUMENTATION_PARAM = 'stock_report_v2.instrumentation'
+SLOW_CALL_PARAM = 'stock_report_v2.slow_call_ms'
+DEFAULT_SLOW_CALL_MS = 2000
+# Slow calls kept per config in the summary.
+SLOW_CALLS_KEPT = 10
+
+# Timings of this process, per database and config.
+_timing_stats = defaultdict(lambda: {
+    'calls': 0,
+    'cache_hits': 0,
+    'total_ms': 0.0,
+    'max_ms': 0.0,
+    'stages': defaultdict(lambda: {'ms': 0.0, 'queries': 0, 'rows': 0}),
+    'slow_calls': deque(maxlen=SLOW_CALLS_KEPT),
+})
+
+
+class ReportTimer:
+    """
+    Measure the stages of one report call: wall time, SQL queries and rows
+    processed. A disabled timer measures nothing.
+    """
+
+    def __init__(self, cr, enabled=True):
+        self.cr = cr
+        self.enabled = enabled
+        self.stages = []
+        self.start = time.perf_counter()
+        self.start_queries = cr.sql_log_count
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the enclosed block; set ``rows`` on the yielded dict."""
+        record = {'name': name, 'rows': 0}
+        if not self.enabled:
+            yield record
+            return
+        start, queries = time.perf_counter(), self.cr.sql_log_count
+        try:
+            yield record
+        finally:
+            record['ms'] = round((time.perf_counter() - start) * 1000, 2)
+            record['queries'] = self.cr.sql_log_count - queries
+            self.stages.append(record)
+
+    def summary(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 2),
+            'queries': self.cr.sql_log_count - self.start_queries,
+            'stages': self.stages,
+        }
+
+
+class StockReportTiming(models.AbstractModel):
+    _name = 'stock.report.timing'
+    _description = 'Stock Report Timing'
+
+    @api.model
+    def _get_timer(self, params):
+        """
+        Timer of a report call, enabled by ``params['debug']`` or the
+        ``stock_report_v2.instrumentation`` system parameter.
+        """
+        enabled = bool(params.get('debug')) or tools.str2bool(
+            self.env['ir.config_parameter'].sudo().get_param(INSTRUMENTATION_PARAM), False,
+        )
+        return ReportTimer(self.env.cr, enabled=enabled)
+
+    @api.model
+    def _record(self, config, options, timer, cache_hit=False):
+        """
+        Log the measures of ``timer`` as a JSON line and add them to the
+        summary of ``config``. Calls slower than the ``stock_report_v2.slow_call_ms``
+        system parameter are logged as warnings with their options.
+        """
+        if not timer.enabled:
+            return
+        summary = timer.summary()
+        entry = {'config_id': config.id, 'cache_hit': cache_hit, **summary}
+        _logger.info("stock_report_timing %s", json.dumps(entry, default=str))
+
+        stats = _timing_stats[self.env.cr.dbname, config.id]
+        stats['calls'] += 1
+        stats['cache_hits'] += int(cache_hit)
+        stats['total_ms'] += summary['total_ms']
+        stats['max_ms'] = max(stats['max_ms'], summary['total_ms'])
+        for stage in summary['stages']:
+            stage_stats = stats['stages'][stage['name']]
+            for measure in ('ms', 'queries', 'rows'):
+                stage_stats[measure] += stage[measure]
+
+        threshold = float(self.env['ir.config_parameter'].sudo().get_param(SLOW_CALL_PARAM, DEFAULT_SLOW_CALL_MS))
+        if summary['total_ms'] >= threshold:
+            slow_call = dict(entry, options=options, uid=self.env.uid)
+            stats['slow_calls'].append(slow_call)
+            _logger.warning("stock_report_slow_call %s", json.dumps(slow_call, default=str))
+
+    @api.model
+    def get_timing_summary(self):
+        """Timings of the current worker for this database, per config id."""
+        dbname = self.env.cr.dbname
+        return {
+            config_id: {
+                'calls': stats['calls'],
+                'cache_hits': stats['cache_hits'],
+                'avg_ms': round(stats['total_ms'] / stats['calls'], 2),
+                'max_ms': stats['max_ms'],
+                'stages': {name: dict(stage) for name, stage in stats['stages'].items()},
+                'slow_calls': list(stats['slow_calls']),
+            }
+            for (db, config_id), stats in list(_timing_stats.items())
+            if db == dbname and stats['calls']
+        }
@@ -1,10 +1,15 @@
 /** @odoo-module **/
 
-import { Component, useState, onWillStart } from "@odoo/owl";
+import { Component, useState, onWillStart, onWillUnmount } from "@odoo/owl";
 import { useService } from "@web/core/utils/hooks";
 import { _t } from "@web/core/l10n/translation";
+import { deserializeDateTime, formatDateTime } from "@web/core/l10n/dates";
 import { Layout } from "@web/search/layout";
 
+const NO_IMAGE_URL = "/stock_report_v2/static/src/img/no-image-found.png";
+const STOCK_CHANNEL = "stock_report_v2.stock";
+const STOCK_NOTIFICATION = "stock_report_v2/stock_changed";
+
 export class DynamicAttributeView extends Component {
     static template = "stock_report_v2.DynamicAttributeView";
     static components = { Layout };
@@ -18,6 +23,7 @@ export class DynamicAttributeView extends Component {
         this.orm = useService("orm");
         this.notification = useService("notification");
         this.actionService = useService("action");
+        this.busService = useService("bus_service");
         
         this.layoutProps = {
             display: { controlPanel: false },
@@ -26,6 +32,11 @@ export class DynamicAttributeView extends Component {
         
         const context = this.props.action.context || {};
         this.configId = context.config_id || false;
+        // Keyset cursors: pageCursors[n] starts page n + 1
+        this.pageCursors = [null];
+        // Token of the last stock delta received, see get_report_delta
+        this.syncToken = null;
+        this._onStockChanged = () => this._scheduleSync();
         
         this.state = useState({
             products: [],
@@ -33,6 +44,17 @@ export class DynamicAttributeView extends Component {
             filteredProducts: [],
             searchInput: "",
             filterType: "all",
+            filterCounts: {},
+            // Breakdown buckets (warehouses or locations), "" shows the total
+            locations: [],
+            locationId: "",
+            // "YYYY-MM-DD" to show the stock at the end of that day, "" for the current stock
+            asOf: "",
+            // Forecast horizons in days, "" shows the configured quantity
+            horizons: [],
+            horizon: "",
+            // {computed_at, stale} when the page comes from the precomputation job
+            precomputed: null,
             loading: true,
             config: null,
             showVariantModal: false,
@@ -50,12 +72,15 @@ export class DynamicAttributeView extends Component {
                     const configs = await this.orm.call(
                         "stock.report.config",
                         "read",
-                        [this.configId, ["name", "primary_attribute_id", "secondary_attribute_id", "use_forecast", "filter_zero", "include_negative"]]
+                        [this.configId, ["name", "primary_attribute_id", "secondary_attribute_id", "use_forecast", "filter_zero", "include_negative", "live_updates"]]
                     );
                     this.state.config = configs[0] || null;
                     
                     if (this.state.config) {
                         this.state.useForecast = this.state.config.use_forecast;
+                        if (this.state.config.live_updates) {
+                            this._startLiveUpdates();
+                        }
                     }
                     
                     await this.fetchData();
@@ -70,9 +95,67 @@ export class DynamicAttributeView extends Component {
                 this.state.loading = false;
             }
         });
+
+        onWillUnmount(() => {
+            if (this._liveUpdates) {
+                this.busService.unsubscribe(STOCK_NOTIFICATION, this._onStockChanged);
+                this.busService.deleteChannel(STOCK_CHANNEL);
+            }
+            clearTimeout(this._syncTimeout);
+        });
+    }
+
+    _startLiveUpdates() {
+        this._liveUpdates = true;
+        this.busService.addChannel(STOCK_CHANNEL);
+        this.busService.subscribe(STOCK_NOTIFICATION, this._onStockChanged);
     }
 
-    async fetchData() {
+    _scheduleSync() {
+        // Coalesce bursts of notifications into a single delta request
+        if (this._syncTimeout) return;
+        this._syncTimeout = setTimeout(async () => {
+            this._syncTimeout = null;
+            await this.syncChanges();
+        }, 1000);
+    }
+
+    async syncChanges() {
+        // Past quantities do not change with live stock
+        if (!this.syncToken || this.state.loading || this.state.asOf) return;
+
+        const variantsById = new Map();
+        for (const product of this.state.products) {
+            for (const variant of product.variants) {
+                variantsById.set(variant.id, variant);
+            }
+        }
+        if (!variantsById.size) return;
+
+        try {
+            const delta = await this.orm.call(
+                "product.attribute.report",
+                "get_report_delta",
+                [this.configId, [...variantsById.keys()], this.syncToken]
+            );
+            if (delta.reset) {
+                await this.fetchData();
+                return;
+            }
+            this.syncToken = delta.token;
+            // Only the changed cells are patched
+            for (const [variantId, quantities] of Object.entries(delta.variants)) {
+                const variant = variantsById.get(Number(variantId));
+                if (variant) {
+                    Object.assign(variant, quantities);
+                }
+            }
+        } catch (error) {
+            console.error("Failed to sync stock changes:", error);
+        }
+    }
+
+    async fetchData({ refresh = false } = {}) {
         try {
             if (!this.state.config) return;
             
@@ -83,8 +166,18 @@ export class DynamicAttributeView extends Component {
                 params: {
                     page: this.state.currentPage,
                     page_size: this.state.pageSize,
+                    cursor: this.pageCursors[this.state.currentPage - 1] || null,
                     search_term: this.state.searchInput || '',
-                    use_forecast: this.state.config.use_forecast
+                    use_forecast: this.state.config.use_forecast,
+                    filter_type: this.state.filterType,
+                    as_of: this.state.asOf || false,
+                    // columnar payload, see _decodeCompactProducts
+                    format: "compact",
+                    pivot: true,
+                    // bypass the server-side result cache
+                    refresh,
+                    // per-stage timings, in developer mode
+                    debug: Boolean(this.env.debug)
                 }
             };
             
@@ -103,10 +196,28 @@ export class DynamicAttributeView extends Component {
             
             this.state.products = this._transformProducts(result.products || []);
             this.state.attributes = result.attributes || [];
+            this.state.filterCounts = result.filter_counts || {};
+            this.state.locations = result.locations || [];
+            this.state.horizons = result.horizons || [];
+            if (!this.state.horizons.some(days => String(days) === this.state.horizon)) {
+                this.state.horizon = "";
+            }
+            if (!this.state.locations.some(location => String(location.id) === this.state.locationId)) {
+                this.state.locationId = "";
+            }
+            this.syncToken = result.sync_token || null;
+            this.state.precomputed = result.precomputed ? {
+                stale: result.precomputed.stale,
+                computedAt: formatDateTime(deserializeDateTime(result.precomputed.computed_at)),
+            } : null;
+            if (result.timings) {
+                console.debug("Stock report timings", result.timings);
+            }
             
             if (result.pagination) {
                 this.state.totalCount = result.pagination.total;
                 this.state.totalPages = result.pagination.pages;
+                this.pageCursors[this.state.currentPage] = result.pagination.next_cursor || null;
             }
             
             this.applyFilters();
@@ -119,37 +230,69 @@ export class DynamicAttributeView extends Component {
         }
     }
 
-    async getRandomProductImage() {
-        try {
-            const response = await fetch('https://fakestoreapi.com/products');
-            const products = await response.json();
-            if (products && products.length > 0) {
-                const randomIndex = Math.floor(Math.random() * products.length);
-                return products[randomIndex].image;
-            }
-        } catch (error) {
-            console.error('Failed to fetch product images:', error);
-        }
-        return null;
-    }
-    
 
     _transformProducts(products) {
+        if (products.format === "compact") {
+            products = this._decodeCompactProducts(products);
+        }
         return products.map(product => ({
             ...product,
             name: this._getFormattedName(product.name),
-            image_url: product.image_url || this.getRandomProductImage(),
+            image_url: product.image_url || NO_IMAGE_URL,
             product_url: product.product_url || `/web#id=${product.id}&model=product.template&view_type=form`,
             variants: (product.variants || []).map(variant => ({
                 ...variant,
                 name: this._getFormattedName(variant.name),
-                image_url: variant.image_url || product.image_url || this.getRandomProductImage(),
+                image_url: variant.image_url || product.image_url || NO_IMAGE_URL,
                 product_url: variant.product_url || `/web#id=${variant.id}&model=product.product&view_type=form`,
                 attributes: variant.attributes || {}
             }))
         }));
     }
 
+    /**
+     * Rebuild the default product layout from the columnar one returned for
+     * `format: "compact"` (see _get_compact_products_data).
+     */
+    _decodeCompactProducts(data) {
+        const { templates, variants } = data;
+        const imageUrl = (model, id, unique) =>
+            unique ? `/web/image/${model}/${id}/${data.image_field}?unique=${unique}` : false;
+        // quantities are columns, possibly nested per horizon or location
+        const pick = (columns, index) =>
+            Array.isArray(columns)
+                ? columns[index]
+                : Object.fromEntries(Object.entries(columns).map(([key, column]) => [key, pick(column, index)]));
+
+        const products = [];
+        let variantIndex = 0;
+        templates.id.forEach((templateId, templateIndex) => {
+            const productVariants = [];
+            for (let count = 0; count < templates.variant_count[templateIndex]; count++, variantIndex++) {
+                const variantId = variants.id[variantIndex];
+                productVariants.push({
+                    id: variantId,
+                    name: variants.name[variantIndex],
+                    default_code: variants.default_code[variantIndex],
+                    ...pick(variants.quantities, variantIndex),
+                    image_url: imageUrl("product.product", variantId, variants.image[variantIndex]),
+                    attributes: Object.fromEntries(
+                        variants.values[variantIndex].map(index => data.attribute_values[index])
+                    ),
+                });
+            }
+            products.push({
+                id: templateId,
+                name: templates.name[templateIndex],
+                image_url: imageUrl("product.template", templateId, templates.image[templateIndex]),
+                variants: productVariants,
+                use_forecast: data.use_forecast,
+                ...(templates.pivot ? { pivot: templates.pivot[templateIndex] } : {}),
+            });
+        });
+        return products;
+    }
+
     _getFormattedName(nameField) {
         if (!nameField) return _t('Product');
         if (typeof nameField === 'string') return nameField;
@@ -167,51 +310,35 @@ export class DynamicAttributeView extends Component {
     }
 
     applyFilters() {
-        let filteredProducts = [...this.state.products];
-        
-        if (this.state.searchInput) {
-            const term = this.state.searchInput.toLowerCase();
-            filteredProducts = filteredProducts.filter(product => 
-                product.name.toLowerCase().includes(term) ||
-                product.variants.some(v => 
-                    v.default_code?.toLowerCase().includes(term) ||
-                    v.name.toLowerCase().includes(term)
-                )
-            );
-        }
-        
-        if (this.state.filterType !== "all") {
-            filteredProducts = filteredProducts.filter(product => 
-                product.variants.some(v => this._matchesFilterType(v))
-            );
-        }
-        
-        if (this.state.config) {
-            if (this.state.config.filter_zero) {
-                filteredProducts = filteredProducts.filter(product => 
-                    product.variants.some(v => v.qty !== 0)
-                );
-            }
-            if (!this.state.config.include_negative) {
-                filteredProducts = filteredProducts.filter(product => 
-                    product.variants.every(v => v.qty >= 0)
-                );
-            }
-        }
-        
-        this.state.filteredProducts = filteredProducts;
-    }
-
-    _matchesFilterType(variant) {
-        switch (this.state.filterType) {
-            case "negative": return variant.qty < 0;
-            case "zero": return variant.qty === 0;
-            case "positive": return variant.qty > 0;
-            case "reserved": return variant.qty_reserved > 0;
-            case "replenishment": return variant.qty_incoming > 0;
-            case "outgoing": return variant.qty_outgoing > 0;
-            default: return true;
+        // Search, filter type and config filters are all applied by the server
+        this.state.filteredProducts = [...this.state.products];
+    }
+
+    formatFilterCount(filterType) {
+        const count = this.state.filterCounts[filterType];
+        return count !== undefined ? ` (${count})` : '';
+    }
+
+    onLocationChange(ev) {
+        // Every bucket is already in the variants, switching needs no request
+        this.state.locationId = ev.target.value;
+    }
+
+    onHorizonChange(ev) {
+        this.state.horizon = ev.target.value;
+    }
+
+    getVariantQty(variant) {
+        if (this.state.horizon) {
+            return variant.horizons?.[this.state.horizon] || 0;
         }
+        const qtyField = this.state.config && this.state.config.use_forecast ? 'virtual_available' : 'qty_available';
+        const source = this.state.locationId ? variant.locations?.[this.state.locationId] : variant;
+        return source ? source[qtyField] : 0;
+    }
+
+    getExportUrl(fileFormat) {
+        return `/stock_report_v2/export/${this.configId}?file_format=${fileFormat}`;
     }
 
     getQuantityClass(qty) {
@@ -236,6 +363,7 @@ export class DynamicAttributeView extends Component {
 
     async changePage(page) {
         if (page < 1 || page > this.state.totalPages) return;
+        // Pages without a known cursor fall back to offset pagination
         this.state.currentPage = page;
         await this.fetchData();
     }
@@ -255,6 +383,7 @@ export class DynamicAttributeView extends Component {
     async onSearchInput(ev) {
         this.state.searchInput = ev.target.value.trim().toLowerCase();
         this.state.currentPage = 1;
+        this.pageCursors = [null];
         if (this._searchTimeout) {
             clearTimeout(this._searchTimeout);
         }
@@ -264,13 +393,22 @@ export class DynamicAttributeView extends Component {
     clearSearch() {
         this.state.searchInput = "";
         this.state.currentPage = 1;
+        this.pageCursors = [null];
         this.fetchData();
     }
 
+    async onAsOfChange(ev) {
+        this.state.asOf = ev.target.value;
+        this.state.currentPage = 1;
+        this.pageCursors = [null];
+        await this.fetchData();
+    }
+
     async onFilterChange(ev) {
         this.state.filterType = ev.target.value;
         this.state.currentPage = 1;
-        this.applyFilters();
+        this.pageCursors = [null];
+        await this.fetchData();
     }
 
     async refreshData() {
@@ -278,7 +416,8 @@ export class DynamicAttributeView extends Component {
             this.state.loading = true;
             this.state.error = null;
             this.state.currentPage = 1;
-            await this.fetchData();
+            this.pageCursors = [null];
+            await this.fetchData({ refresh: true });
             if (!this.state.error) {
                 this.notification.add(_t("Data refreshed"), { type: "success" });
             }
@@ -303,29 +442,41 @@ export class DynamicAttributeView extends Component {
         const attributes = this.formatAttributesForDisplay(variant.attributes);
         const attributesList = attributes.map(attr => attr.value).join(', ');
         
-        const qtyField = this.state.config && this.state.config.use_forecast ? 'virtual_available' : 'qty_available';
-        
         this.state.selectedVariant = {
             product: { name: productName },
             id: variant.id,
             name: `${productName} - ${attributesList || variant.default_code || _t('Default')}`,
             default_code: variant.default_code,
-            image: variant.image_url || this.getRandomProductImage(),
-            qty: variant[qtyField] || 0,
+            image: variant.image_url || NO_IMAGE_URL,
+            qty: this.getVariantQty(variant) || 0,
             qty_on_hand: variant.qty_available || 0,
             qty_reserved: variant.qty_reserved || 0,
             qty_incoming: variant.qty_incoming || 0,
             qty_outgoing: variant.qty_outgoing || 0,
             virtual_available: variant.virtual_available || 0,
+            curve: this._getProjectedCurve(variant),
             attributes: attributes,
             attributesList: attributesList || variant.default_code || _t('Default'),
-            quantityClass: this.getQuantityClass(variant[qtyField]),
+            quantityClass: this.getQuantityClass(this.getVariantQty(variant)),
             product_url: variant.product_url || (product ? product.product_url : '#')
         };
 
         this.state.showVariantModal = true;
     }
     
+    _getProjectedCurve(variant) {
+        if (!this.state.horizons.length || !variant.horizons) return [];
+        const points = [
+            { label: _t("Today"), qty: variant.qty_available || 0 },
+            ...this.state.horizons.map(days => ({
+                label: _t("In %s days", days),
+                qty: variant.horizons[days] || 0,
+            })),
+        ];
+        const scale = Math.max(...points.map(point => Math.abs(point.qty)), 1);
+        return points.map(point => ({ ...point, width: Math.round(Math.abs(point.qty) / scale * 100) }));
+    }
+
     formatAttributesForDisplay(attributes) {
         if (!attributes || typeof attributes !== 'object') return [];
         
@@ -358,6 +509,10 @@ export class DynamicAttributeView extends Component {
         const [primaryAttr, secondaryAttr] = this.state.attributes;
         if (!primaryAttr || !secondaryAttr) return null;
 
+        if (product.pivot !== undefined) {
+            return this._createMatrixFromPivot(product, primaryAttr, secondaryAttr);
+        }
+
         const primaryValues = primaryAttr.values.map(v => ({
             id: v.id,
             name: v.display_name || v.name
@@ -370,8 +525,6 @@ export class DynamicAttributeView extends Component {
 
         const column_headers = secondaryValues.map(v => v.name);
 
-        const qtyField = this.state.config && this.state.config.use_forecast ? 'virtual_available' : 'qty_available';
-
         const rows = primaryValues.map(primaryValue => {
             return {
                 header: primaryValue.name,
@@ -383,7 +536,7 @@ export class DynamicAttributeView extends Component {
                         );
                     });
                     return variant ? { 
-                        qty: variant[qtyField], 
+                        qty: this.getVariantQty(variant), 
                         variant 
                     } : null;
                 })
@@ -396,6 +549,28 @@ export class DynamicAttributeView extends Component {
         };
     }
     
+    _createMatrixFromPivot(product, primaryAttr, secondaryAttr) {
+        const pivot = product.pivot;
+        if (!pivot) return null;
+
+        const variantsById = new Map(product.variants.map(v => [v.id, v]));
+        const primaryNames = new Map(primaryAttr.values.map(v => [v.id, v.display_name || v.name]));
+
+        // Columns follow the page header, cells are direct lookups in the server pivot
+        const rows = pivot.rows.map(primaryId => ({
+            header: primaryNames.get(primaryId) || String(primaryId),
+            cells: secondaryAttr.values.map(secondaryValue => {
+                const variant = variantsById.get(pivot.cells[`${primaryId},${secondaryValue.id}`]);
+                return variant ? { qty: this.getVariantQty(variant), variant } : null;
+            })
+        }));
+
+        return {
+            rows,
+            column_headers: secondaryAttr.values.map(v => v.display_name || v.name)
+        };
+    }
+    
     handleCellClick(cell, productId) {
         if (cell?.variant) {
             this.showVariantDetails(cell.variant); 
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from . import test_report_benchmark
+from . import test_report_precomputed
+from . import test_stock_queries
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import random
+import time
+import tracemalloc
+
+from odoo.addons.stock_report_v2.models.stock_report_aggregator import PENDING_MOVE_STATES
+from odoo.tests import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+# Size of the synthetic catalog, overridable to benchmark larger datasets.
+BENCHMARK_TEMPLATES = int(os.environ.get('STOCK_REPORT_BENCHMARK_TEMPLATES', 200))
+BENCHMARK_SEED = int(os.environ.get('STOCK_REPORT_BENCHMARK_SEED', 42))
+
+PRODUCT_WORDS = ['Shirt', 'Jacket', 'Trousers', 'Dress', 'Sweater']
+SIZE_VALUES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+COLOR_VALUES = ['Black', 'White', 'Red', 'Blue', 'Green', 'Yellow']
+
+
+class StockReportBenchmarkCommon(TransactionCase):
+    """
+    Generates a deterministic synthetic catalog: templates with a size and a
+    color attribute, quants spread over internal and non-internal locations
+    and pending moves in every state counted by the report.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.benchmark_results = []
+        cls.rng = random.Random(BENCHMARK_SEED)
+
+        cls.size_attribute = cls._create_attribute('Benchmark Size', SIZE_VALUES)
+        cls.color_attribute = cls._create_attribute('Benchmark Color', COLOR_VALUES)
+
+        warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        cls.stock_location = warehouse.lot_stock_id
+        cls.shelf_location = cls.env['stock.location'].create({
+            'name': 'Benchmark Shelf',
+            'usage': 'internal',
+            'location_id': cls.stock_location.id,
+        })
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+        cls.supplier_location = cls.env.ref('stock.stock_location_suppliers')
+
+        cls.templates = cls._generate_templates(BENCHMARK_TEMPLATES)
+        cls.variants = cls.templates.product_variant_ids
+        cls._generate_stock(cls.variants)
+
+        cls.config = cls.env['stock.report.config'].create({
+            'name': 'Benchmark Report',
+            'primary_attribute_id': cls.size_attribute.id,
+            'secondary_attribute_id': cls.color_attribute.id,
+        })
+        cls.forecast_config = cls.config.copy({'name': 'Benchmark Forecast', 'use_forecast': True})
+        cls.env.flush_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        for label, duration, queries, peak in cls.benchmark_results:
+            _logger.info("%-60s %8.1f ms %5d queries %8.1f KiB", label, duration * 1000, queries, peak / 1024)
+        super().tearDownClass()
+
+    @classmethod
+    def _create_attribute(cls, name, values):
+        return cls.env['product.attribute'].create({
+            'name': name,
+            'create_variant': 'always',
+            'value_ids': [(0, 0, {'name': value, 'sequence': sequence}) for sequence, value in enumerate(values)],
+        })
+
+    @classmethod
+    def _generate_templates(cls, count):
+        rng = cls.rng
+        sizes, colors = cls.size_attribute.value_ids, cls.color_attribute.value_ids
+        vals_list = []
+        for index in range(count):
+            vals_list.append({
+                'name': f'Benchmark {rng.choice(PRODUCT_WORDS)} {index:05d}',
+                'default_code': f'BENCH-{index:05d}',
+                'type': 'product',
+                'attribute_line_ids': [
+                    (0, 0, {'attribute_id': cls.size_attribute.id,
+                            'value_ids': [(6, 0, rng.sample(sizes.ids, rng.randint(2, len(sizes))))]}),
+                    (0, 0, {'attribute_id': cls.color_attribute.id,
+                            'value_ids': [(6, 0, rng.sample(colors.ids, rng.randint(1, len(colors))))]}),
+                ],
+            })
+        return cls.env['product.template'].create(vals_list)
+
+    @classmethod
+    def _generate_stock(cls, variants):
+        rng = cls.rng
+        quant_vals, move_vals, move_states = [], [], []
+        for variant in variants:
+            for location in (cls.stock_location, cls.shelf_location, cls.customer_location):
+                if rng.random() < 0.5:
+                    quant_vals.append({
+                        'product_id': variant.id,
+                        'location_id': location.id,
+                        'quantity': rng.randint(-5, 50),
+                    })
+            for source, destination in ((cls.supplier_location, cls.stock_location),
+                                        (cls.stock_location, cls.customer_location),
+                                        (cls.stock_location, cls.shelf_location)):
+                if rng.random() < 0.3:
+                    move_vals.append({
+                        'name': variant.display_name,
+                        'product_id': variant.id,
+                        'product_uom': variant.uom_id.id,
+                        'product_uom_qty': rng.randint(1, 20),
+                        'location_id': source.id,
+                        'location_dest_id': destination.id,
+                    })
+                    move_states.append(rng.choice(PENDING_MOVE_STATES))
+        cls.env['stock.quant'].create(quant_vals)
+        moves = cls.env['stock.move'].create(move_vals)
+        for state in PENDING_MOVE_STATES:
+            moves.browse([
+                move.id for move, move_state in zip(moves, move_states) if move_state == state
+            ]).write({'state': state})
+
+    def measure(self, label, func):
+        """
+        Run ``func`` on an empty ORM cache and record its duration, number of
+        SQL queries and peak Python memory. Returns ``(result, queries)``.
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.cr.sql_log_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = func()
+            duration = time.perf_counter() - start
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        queries = self.cr.sql_log_count - queries
+        self.benchmark_results.append((label, duration, queries, peak))
+        return result, queries
+
+    def get_report_data(self, config, **params):
+        params.setdefault('refresh', True)
+        return self.env['product.attribute.report'].with_context(params=params).get_report_data_by_config(config.id)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import StockReportBenchmarkCommon
+
+# Upper bounds on the SQL queries of one call. They do not depend on the page
+# size: a change making them grow with the number of products is an N+1.
+QUERY_BUDGETS = {
+    'get_report_data_by_config': 40,
+    '_get_stock_data': 5,
+    '_prepare_products_data': 20,
+}
+PAGE_SIZES = [10, 50]
+SEARCH_TERMS = ['', 'Jacket', 'BENCH-0001']
+
+
+@tagged('post_install', '-at_install', 'stock_report_benchmark')
+class TestStockReportBenchmark(StockReportBenchmarkCommon):
+
+    def assertQueriesIndependentOfPageSize(self, label, run, prepare=None):
+        """
+        ``run(page_size)`` uses the same number of queries for every page size,
+        within the budget of the measured method. ``prepare(page_size)``
+        computes the arguments of ``run`` outside of the measurement.
+        """
+        counts = {}
+        for page_size in PAGE_SIZES:
+            args = prepare(page_size) if prepare else (page_size,)
+            counts[page_size] = self.measure(f'{label} page_size={page_size}', lambda: run(*args))[1]
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f"{label}: query count grows with the page size {counts}",
+        )
+        self.assertLessEqual(max(counts.values()), QUERY_BUDGETS[label.split()[0]], f"{label}: {counts}")
+
+    def test_report_data(self):
+        for config in (self.config, self.forecast_config):
+            for search_term in SEARCH_TERMS:
+                # the first call fills the filter counts cache, page sizes are compared warm
+                self.get_report_data(config, page_size=PAGE_SIZES[0], search_term=search_term)
+
+                def run(page_size):
+                    result = self.get_report_data(config, page_size=page_size, search_term=search_term)
+                    self.assertNotIn('error', result)
+                    return result
+
+                self.assertQueriesIndependentOfPageSize(
+                    f'get_report_data_by_config use_forecast={config.use_forecast} search={search_term!r}', run,
+                )
+
+    def test_report_pages(self):
+        """Walking every page with the keyset cursor returns each template once."""
+        seen, cursor = [], None
+        while True:
+            result = self.get_report_data(self.config, page_size=PAGE_SIZES[-1], cursor=cursor)
+            seen += [product['id'] for product in result['products']]
+            cursor = result['pagination'].get('next_cursor')
+            if not cursor:
+                break
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), result['pagination']['total'])
+
+    def test_stock_data(self):
+        report = self.env['product.attribute.report']
+        for use_forecast in (False, True):
+            self.assertQueriesIndependentOfPageSize(
+                f'_get_stock_data use_forecast={use_forecast}',
+                lambda page_size: report._get_stock_data(self.variants[:page_size * 10].ids, use_forecast),
+            )
+
+    def test_stock_data_values(self):
+        """The aggregated quantities match the ORM computation."""
+        variants = self.variants[:50]
+        stock_data = self.env['product.attribute.report']._get_stock_data(variants.ids, True)
+        for variant in variants:
+            self.assertAlmostEqual(stock_data[variant.id]['qty_available'], variant.qty_available)
+            self.assertAlmostEqual(stock_data[variant.id]['incoming_qty'], variant.incoming_qty)
+            self.assertAlmostEqual(stock_data[variant.id]['outgoing_qty'], variant.outgoing_qty)
+
+    def test_prepare_products_data(self):
+        report = self.env['product.attribute.report']
+        for config in (self.config, self.forecast_config):
+            def prepare(page_size):
+                templates = self.templates[:page_size]
+                variants = templates.product_variant_ids
+                return templates, variants, report._get_stock_data(variants.ids, config.use_forecast), config
+
+            self.assertQueriesIndependentOfPageSize(
+                f'_prepare_products_data use_forecast={config.use_forecast}',
+                report._prepare_products_data, prepare,
+            )
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo.addons.stock_report_v2.models.stock_report_precomputed import PRECOMPUTE_PARAMS
+from odoo.tests import TransactionCase, tagged
+from odoo.tests.common import new_test_user
+
+
+@tagged('post_install', '-at_install')
+class TestStockReportPrecomputed(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company_a = cls.env.company
+        cls.company_b = cls.env['res.company'].create({'name': 'Precomputed Company B'})
+        cls.user_a = new_test_user(
+            cls.env, login='precomputed_stock_user', groups='base.group_user,stock.group_stock_user',
+            company_id=cls.company_a.id, company_ids=[(6, 0, cls.company_a.ids)],
+        )
+
+        size = cls.env['product.attribute'].create({
+            'name': 'Precomputed Size', 'create_variant': 'always',
+            'value_ids': [(0, 0, {'name': value}) for value in ('S', 'M')],
+        })
+        color = cls.env['product.attribute'].create({
+            'name': 'Precomputed Color', 'create_variant': 'always',
+            'value_ids': [(0, 0, {'name': value}) for value in ('Red', 'Blue')],
+        })
+        cls.templates = {}
+        for name, company in (('Precomputed Shared', False), ('Precomputed A', cls.company_a),
+                              ('Precomputed B', cls.company_b)):
+            template = cls.env['product.template'].create({
+                'name': name,
+                'type': 'product',
+                'company_id': company and company.id,
+                'attribute_line_ids': [
+                    (0, 0, {'attribute_id': size.id, 'value_ids': [(6, 0, size.value_ids.ids)]}),
+                    (0, 0, {'attribute_id': color.id, 'value_ids': [(6, 0, color.value_ids.ids)]}),
+                ],
+            })
+            cls.templates[name] = template
+            for stock_company in (company or cls.company_a, company or cls.company_b):
+                warehouse = cls.env['stock.warehouse'].search([('company_id', '=', stock_company.id)], limit=1)
+                cls.env['stock.quant'].create([{
+                    'product_id': variant.id,
+                    'location_id': warehouse.lot_stock_id.id,
+                    'quantity': 5,
+                } for variant in template.product_variant_ids])
+
+        cls.config = cls.env['stock.report.config'].create({
+            'name': 'Precomputed Report',
+            'primary_attribute_id': size.id,
+            'secondary_attribute_id': color.id,
+        })
+        cls.env.flush_all()
+
+    def get_report_data(self, **params):
+        report = self.env['product.attribute.report'].with_user(self.user_a).with_context(
+            allowed_company_ids=self.company_a.ids, lang='en_US',
+            params=dict(PRECOMPUTE_PARAMS, page=1, **params),
+        )
+        result = report.get_report_data_by_config(self.config.id)
+        self.assertNotIn('error', result)
+        return result
+
+    def test_precomputed_page_matches_live(self):
+        """The cron runs as superuser, the page it stores is the one a user of the company gets live."""
+        self.env['stock.report.precomputed']._cron_precompute()
+
+        stored = self.get_report_data()
+        self.assertIn('precomputed', stored)
+        live = self.get_report_data(refresh=True)
+        self.assertNotIn('precomputed', live)
+
+        def normalize(result):
+            keys = ('products', 'attributes', 'pagination', 'filter_counts', 'locations', 'horizons')
+            return json.loads(json.dumps({key: result.get(key) for key in keys}, default=str))
+
+        self.assertEqual(normalize(stored), normalize(live))
+        self.assertEqual(stored['pagination']['total'], 2)
+        products = json.dumps(stored['products'])
+        self.assertIn('Precomputed A', products)
+        self.assertNotIn('Precomputed B', products)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestStockQueries(TransactionCase):
+    """Behavior of the aggregated stock statements on a small, known stock."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.aggregator = cls.env['stock.report.aggregator']
+        warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        cls.stock_location = warehouse.lot_stock_id
+        cls.shelf_location = cls.env['stock.location'].create({
+            'name': 'Query Shelf', 'usage': 'internal', 'location_id': cls.stock_location.id,
+        })
+        cls.bin_location = cls.env['stock.location'].create({
+            'name': 'Query Bin', 'usage': 'internal', 'location_id': cls.shelf_location.id,
+        })
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+        cls.supplier_location = cls.env.ref('stock.stock_location_suppliers')
+        cls.product, cls.other_product = cls.env['product.product'].create([
+            {'name': 'Query Product', 'type': 'product'},
+            {'name': 'Query Other Product', 'type': 'product'},
+        ])
+
+    @classmethod
+    def _create_quants(cls, product, quantities):
+        cls.env['stock.quant'].create([
+            {'product_id': product.id, 'location_id': location.id, 'quantity': quantity}
+            for location, quantity in quantities
+        ])
+
+    @classmethod
+    def _create_move(cls, product, source, destination, quantity, state='confirmed', date=None):
+        move = cls.env['stock.move'].create({
+            'name': product.name,
+            'product_id': product.id,
+            'product_uom': product.uom_id.id,
+            'product_uom_qty': quantity,
+            'location_id': source.id,
+            'location_dest_id': destination.id,
+        })
+        move.write(dict({'state': state}, **({'date': date} if date else {})))
+        return move
+
+    @classmethod
+    def _create_done_move(cls, product, source, destination, quantity, date):
+        move = cls._create_move(product, source, destination, quantity, state='draft')
+        move._action_confirm()
+        move._action_assign()
+        move.write({'quantity': quantity, 'picked': True})
+        move._action_done()
+        move.move_line_ids.write({'date': date})
+        return move
+
+    def _get_location_quantities(self, date, base_date):
+        self.env.cr.execute(self.env['stock.report.snapshot']._get_location_quantities_query(
+            self.product.ids, date, base_date=base_date,
+        ))
+        return {
+            location_id: quantity
+            for _product_id, location_id, quantity in self.env.cr.fetchall()
+            if quantity
+        }
+
+    def test_breakdown_totals(self):
+        """Bucket totals equal the plain aggregate, nested buckets count each location once."""
+        self._create_quants(self.product, [
+            (self.stock_location, 10), (self.shelf_location, 5), (self.bin_location, 3),
+        ])
+        self._create_move(self.product, self.supplier_location, self.bin_location, 4)
+        self._create_move(self.product, self.stock_location, self.customer_location, 2)
+        self._create_move(self.product, self.shelf_location, self.stock_location, 1)
+        buckets = [
+            (self.stock_location.id, self.stock_location.parent_path),
+            (self.shelf_location.id, self.shelf_location.parent_path),
+        ]
+
+        plain = self.aggregator._get_stock_quantities(self.product.ids, use_forecast=True)[self.product.id]
+        breakdown = self.aggregator._get_stock_quantities(self.product.ids, use_forecast=True, buckets=buckets)[self.product.id]
+        locations = breakdown.pop('locations')
+        self.assertEqual(breakdown, plain)
+        self.assertEqual(plain['qty_available'], 18)
+        self.assertEqual(plain['incoming_qty'], 4)
+        self.assertEqual(plain['outgoing_qty'], 2)
+
+        # the bin belongs to the shelf only, the shelf to stock transfer moves between buckets
+        stock, shelf = locations[self.stock_location.id], locations[self.shelf_location.id]
+        self.assertEqual((stock['qty_available'], stock['incoming_qty'], stock['outgoing_qty']), (10, 1, 2))
+        self.assertEqual((shelf['qty_available'], shelf['incoming_qty'], shelf['outgoing_qty']), (8, 4, 1))
+        self.assertEqual(stock['qty_available'] + shelf['qty_available'], plain['qty_available'])
+
+    def test_snapshot_replay(self):
+        """A snapshot replayed forward gives the live quants, the live quants replayed backward the snapshot."""
+        # moves leave from locations without children, so reservations cannot pick elsewhere
+        aisle_location = self.env['stock.location'].create({
+            'name': 'Query Aisle', 'usage': 'internal', 'location_id': self.stock_location.id,
+        })
+        now = fields.Datetime.now()
+        snapshot_date, move_date = now - timedelta(days=2), now - timedelta(days=1)
+        self._create_quants(self.product, [(self.bin_location, 10), (aisle_location, 5)])
+        snapshot = self.env['stock.report.snapshot']
+        snapshot._take_snapshot()
+        snapshot.search([('date', '>=', now)]).write({'date': snapshot_date})
+        snapshot_quantities = {
+            record.location_id.id: record.quantity
+            for record in snapshot.search([('date', '=', snapshot_date), ('product_id', '=', self.product.id)])
+        }
+        self.assertEqual(snapshot_quantities, {self.bin_location.id: 10, aisle_location.id: 5})
+
+        self._create_done_move(self.product, self.supplier_location, self.bin_location, 4, move_date)
+        self._create_done_move(self.product, self.bin_location, self.customer_location, 3, move_date)
+        self._create_done_move(self.product, aisle_location, self.stock_location, 2, move_date)
+
+        live = self._get_location_quantities(now, base_date=False)
+        self.assertEqual(live, {self.bin_location.id: 11, aisle_location.id: 3, self.stock_location.id: 2})
+        self.assertEqual(self._get_location_quantities(now, base_date=snapshot_date), live)
+        self.assertEqual(self._get_location_quantities(snapshot_date, base_date=False), snapshot_quantities)
+
+    def test_horizon_projection(self):
+        """Horizons cumulate their moves, overdue ones in the first, those past the last ignored."""
+        now = fields.Datetime.now()
+        self._create_quants(self.product, [(self.stock_location, 10)])
+        self._create_move(self.product, self.supplier_location, self.stock_location, 2, date=now - timedelta(days=3))
+        self._create_move(self.product, self.stock_location, self.customer_location, 1, date=now + timedelta(days=5))
+        self._create_move(self.product, self.supplier_location, self.stock_location, 4, date=now + timedelta(days=20))
+        self._create_move(self.product, self.stock_location, self.customer_location, 10, date=now + timedelta(days=60))
+        self._create_move(self.product, self.stock_location, self.shelf_location, 7, date=now + timedelta(days=5))
+        self._create_move(self.other_product, self.supplier_location, self.stock_location, 3, date=now + timedelta(days=20))
+
+        stock_data = self.aggregator._get_stock_quantities(
+            (self.product | self.other_product).ids, horizons=[7, 30],
+        )
+        self.assertEqual(stock_data[self.product.id]['horizons'], {7: 11, 30: 15})
+        # a horizon without moves keeps the quantity of the previous one
+        self.assertEqual(stock_data[self.other_product.id]['horizons'], {7: 0, 30: 3})